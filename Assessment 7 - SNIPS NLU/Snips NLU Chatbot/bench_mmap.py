@@ -0,0 +1,80 @@
+# ====================================================================
+# bench_mmap.py: Load time and resident memory, JSON vs mmap engine
+# Starts 1, 8 and 32 independent worker processes (spawned, so nothing
+# is inherited from this one), each loading the same engine from disk
+# and parsing a few utterances, then reads their memory from
+# /proc/<pid>/smaps_rollup. Mapped weights are file-backed shared pages:
+# their PSS is split between the workers instead of counted N times.
+# Run: python bench_mmap.py [--engine-dir DIR]
+# ====================================================================
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from engine_cache import load_engine, load_or_train_engine
+from mmap_weights import convert_engine_dir
+from prefork_server import memory_usage
+
+WORKER_COUNTS = (1, 8, 32)
+UTTERANCES = ("turn on the lights in the kitchen", "what is the temperature",
+              "switch off the bedroom light please", "hello there")
+
+
+def _worker(engine_dir, ready, stop):
+    start = time.perf_counter()
+    engine = load_engine(engine_dir)
+    seconds = time.perf_counter() - start
+    for text in UTTERANCES:
+        engine.parse(text)
+    ready.put((os.getpid(), seconds))
+    stop.wait()
+
+
+def run_workers(engine_dir, count):
+    """Returns (mean load seconds, [memory_usage of each worker])."""
+    ctx = multiprocessing.get_context("spawn")
+    ready, stop = ctx.Queue(), ctx.Event()
+    processes = [ctx.Process(target=_worker, args=(engine_dir, ready, stop)) for _ in range(count)]
+    for p in processes:
+        p.start()
+    try:
+        loads = [ready.get(timeout=600) for _ in processes]
+        usage = [memory_usage(pid) for pid, _ in loads]
+    finally:
+        stop.set()
+        for p in processes:
+            p.join()
+    return sum(seconds for _, seconds in loads) / count, usage
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Resident memory of N workers, JSON vs mmap engine")
+    parser.add_argument("--engine-dir", help="persisted engine (default: the cached engine for dataset.json)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    engine_dir = args.engine_dir or load_or_train_engine("dataset.json")[1]["path"]
+    root = tempfile.mkdtemp(prefix="bench-mmap-")
+    try:
+        mmap_dir = os.path.join(root, "engine")
+        convert_engine_dir(engine_dir, mmap_dir)
+        print(f"--- {engine_dir}: JSON vs memory-mapped weights ---")
+        print("format\tworkers\tload (s)\trss MB/worker\tprivate MB/worker\tpss MB total")
+        for count in WORKER_COUNTS:
+            for label, path in (("json", engine_dir), ("mmap", mmap_dir)):
+                seconds, usage = run_workers(path, count)
+                if None in usage:
+                    print(f"{label}\t{count}\t{seconds:.3f}\t\t(memory needs /proc/<pid>/smaps_rollup)")
+                    continue
+                rss = sum(u["rss_kb"] for u in usage) / count / 1024
+                private = sum(u["private_kb"] for u in usage) / count / 1024
+                pss = sum(u["pss_kb"] for u in usage) / 1024
+                print(f"{label}\t{count}\t{seconds:.3f}\t\t{rss:.1f}\t\t{private:.1f}\t\t\t{pss:.1f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,62 @@
+# ====================================================================
+# bench_training.py: Wall time of a seeded engine fit vs slot-filler workers
+# Trains dataset.json once per worker count, persists every engine and
+# checks that all of them are byte-identical to the single-worker fit.
+# Run: python bench_training.py [dataset.json] [--workers 1 2 4 8] [--seed 42]
+# ====================================================================
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from engine_cache import _fit_assembled
+
+
+def tree_digest(root):
+    """Hashes every file (relative path + content) under root."""
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            digest.update(os.path.relpath(path, root).encode("utf8"))
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seeded training wall time vs workers")
+    parser.add_argument("dataset", nargs="?", default="dataset.json")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with open(args.dataset, encoding="utf8") as f:
+        dataset = json.load(f)
+
+    print(f"--- Seeded training, {len(dataset['intents'])} intents, "
+          f"{os.cpu_count()} cores, seed {args.seed} ---")
+    print("workers\twall (s)\tspeedup\tmodel digest")
+    out_root = tempfile.mkdtemp(prefix="bench-training-")
+    baseline_time = baseline_digest = None
+    try:
+        for workers in args.workers:
+            start = time.perf_counter()
+            engine = _fit_assembled(dataset, None, {}, args.seed, workers)
+            elapsed = time.perf_counter() - start
+
+            engine_dir = os.path.join(out_root, f"workers_{workers}")
+            engine.persist(engine_dir)
+            digest = tree_digest(engine_dir)
+            if baseline_digest is None:
+                baseline_time, baseline_digest = elapsed, digest
+            print(f"{workers}\t{elapsed:.2f}\t\t{baseline_time / elapsed:.2f}x\t{digest}")
+            assert digest == baseline_digest, f"{workers} workers produced a different model"
+    finally:
+        shutil.rmtree(out_root, ignore_errors=True)
+    print("All fits are identical to the first one.")
@@ -0,0 +1,86 @@
+# ====================================================================
+# bench_transcript.py: Per-turn cost of transcript logging under load
+# N threads each log M synthetic turns as fast as they can, either via
+# the TranscriptLogger (queue + background writer) or with the naive
+# approach (json.dumps + write + flush under a lock on every turn).
+# Synthetic producers log far faster than real turns arrive, so with many
+# threads the writer falls behind and the pending cap drops records.
+# Run: python bench_transcript.py
+# ====================================================================
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from pipeline_metrics import PIPELINE_STAGES
+from transcript_logger import TranscriptLogger
+
+TURNS_PER_THREAD = 20_000
+TURN = {
+    "session_id": "bench", "intent": "turnLightOn", "probability": 0.93,
+    "slots": [{"slotName": "room", "value": "kitchen"}],
+    "response": "Got it, Valued User. Turning the lights ON in the kitchen.",
+}
+TIMINGS = (0.000002, 0.0004, 0.00001, 0.000003)
+
+
+def run_threads(threads, per_turn):
+    """Returns the mean seconds per_turn() takes on a producer thread."""
+    barrier = threading.Barrier(threads + 1)
+    spent = []
+
+    def producer():
+        barrier.wait()
+        start = time.perf_counter()
+        for _ in range(TURNS_PER_THREAD):
+            per_turn()
+        spent.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=producer) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    for t in workers:
+        t.join()
+    return sum(spent) / (threads * TURNS_PER_THREAD)
+
+
+def bench_async(directory, threads):
+    logger = TranscriptLogger(directory, timing_fields=PIPELINE_STAGES, max_segment_bytes=4 << 20)
+    per_turn = run_threads(threads, lambda: logger.log("bench", "turn on the kitchen lights",
+                                                       TURN, TIMINGS))
+    start = time.perf_counter()
+    logger.close()
+    return per_turn, time.perf_counter() - start, logger.stats()
+
+
+def bench_sync(directory, threads):
+    lock = threading.Lock()
+    with gzip.open(os.path.join(directory, "naive.jsonl.gz"), "wb") as f:
+        def per_turn():
+            record = dict(TURN, ts=time.time(), text="turn on the kitchen lights",
+                          timings=dict(zip(PIPELINE_STAGES, TIMINGS)))
+            line = (json.dumps(record) + "\n").encode("utf8")
+            with lock:
+                f.write(line)
+                f.flush()
+        return run_threads(threads, per_turn)
+
+
+if __name__ == "__main__":
+    print(f"--- Transcript logging, {TURNS_PER_THREAD} turns per thread ---")
+    print("threads\tqueued (us/turn)\tnaive write (us/turn)\tdrain at close (s)\tsegments\tdropped")
+    for threads in (1, 4, 16):
+        root = tempfile.mkdtemp(prefix="bench-transcript-")
+        try:
+            t_async, drain, stats = bench_async(os.path.join(root, "async"), threads)
+            os.makedirs(os.path.join(root, "sync"))
+            t_sync = bench_sync(os.path.join(root, "sync"), threads)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        print(f"{threads}\t{t_async * 1e6:.2f}\t\t\t{t_sync * 1e6:.2f}\t\t\t{drain:.2f}\t\t\t"
+              f"{stats['segments']}\t\t{stats['dropped']}")
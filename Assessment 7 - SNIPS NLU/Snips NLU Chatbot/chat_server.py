@@ -0,0 +1,294 @@
+# ====================================================================
+# chat_server.py: Minimal asyncio HTTP/1.1 front-end for the chatbot
+# POST /chat   {"session_id": "...", "text": "..."}  -> JSON bot turn
+#              (+ optional "tenant_id" in multi-tenant mode)
+# GET  /health                                         -> JSON server stats
+# GET  /metrics                                        -> Prometheus text (if enabled)
+# Parsing is CPU-bound, so each turn runs on a bounded thread pool; when
+# more than max_pending turns are queued the server answers 503 right away
+# instead of letting latency grow without bound.
+# ====================================================================
+
+import asyncio
+import json
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_HEADERS = 100
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HttpError(Exception):
+    """Raised while reading a request that cannot be served."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# --- 1. HTTP WIRE FORMAT ---
+async def _read_line(reader):
+    # StreamReader.readline raises ValueError once a line outgrows the reader's limit
+    try:
+        return await reader.readline()
+    except ValueError:
+        raise HttpError(431, "request line or header too long")
+
+
+async def read_request(reader):
+    """Reads one request; returns (method, path, headers, body) or None on EOF."""
+    request_line = await _read_line(reader)
+    if not request_line:
+        return None
+    try:
+        method, path, _version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+
+    headers = {}
+    while True:
+        line = await _read_line(reader)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HttpError(400, "too many headers")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HttpError(400, "invalid Content-Length")
+    if length < 0:
+        raise HttpError(400, "invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+def encode_response(status, payload, keep_alive=True, extra_headers=()):
+    """Serializes a response with its status line and headers.
+
+    Dicts are sent as JSON; strings are sent as plain text.
+    """
+    if isinstance(payload, str):
+        body = payload.encode("utf8")
+        content_type = "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        body = json.dumps(payload).encode("utf8")
+        content_type = "application/json"
+    lines = [
+        f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    lines.extend(f"{name}: {value}" for name, value in extra_headers)
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+# --- 2. THE SERVER ---
+class ChatServer:
+    """Serves process_turn(text, session_id) -> dict over HTTP.
+
+    process_turn runs on a pool of `workers` threads. At most `max_pending`
+    turns may be queued or running; extra requests get 503 + Retry-After.
+    If given, metrics() must return Prometheus text, served on GET /metrics,
+    and health() a dict merged into the GET /health payload.
+    With tenants (a container of tenant ids), requests may carry a "tenant_id";
+    those turns call process_turn(text, session_id, tenant_id), unknown ids get 404.
+    """
+
+    def __init__(self, process_turn, host="127.0.0.1", port=8080, workers=4,
+                 max_pending=64, grace_seconds=10.0, metrics=None, health=None,
+                 tenants=None):
+        self.process_turn = process_turn
+        self.metrics = metrics
+        self.health = health
+        self.tenants = tenants
+        self.host = host
+        self.port = port
+        self.max_pending = max_pending
+        self.grace_seconds = grace_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="chat-turn")
+        self._server = None
+        self._writers = set()
+        self._connections = set()  # one handler task per open connection
+        self._pending = 0
+        self._idle = None
+        self._closing = False
+        self.served = 0
+        self.rejected = 0
+        self.errors = 0
+
+    async def start(self, sock=None):
+        """Starts listening, on (host, port) or on an already-bound socket."""
+        self._idle = asyncio.Event()
+        self._idle.set()
+        if sock is not None:
+            self._server = await asyncio.start_server(self._handle_connection, sock=sock)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection,
+                                                      self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self._server
+
+    async def shutdown(self):
+        """Stops accepting, lets in-flight turns finish, then closes connections."""
+        self._closing = True
+        self._server.close()
+        try:
+            await asyncio.wait_for(self._idle.wait(), self.grace_seconds)
+        except asyncio.TimeoutError:
+            print(f"Shutdown grace period expired with {self._pending} turn(s) still running.")
+        for writer in list(self._writers):
+            writer.close()
+        if self._connections:
+            # Let idle keep-alive handlers see EOF and return instead of being cancelled
+            await asyncio.wait(list(self._connections), timeout=1.0)
+        await self._server.wait_closed()
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        stats = {
+            "status": "closing" if self._closing else "ok",
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "served": self.served,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+        if self.health is not None:
+            stats.update(self.health())
+        return stats
+
+    async def _handle_connection(self, reader, writer):
+        self._writers.add(writer)
+        self._connections.add(asyncio.current_task())
+        try:
+            while not self._closing:
+                try:
+                    request = await read_request(reader)
+                except HttpError as e:
+                    writer.write(encode_response(e.status, {"error": e.message}, keep_alive=False))
+                    await writer.drain()
+                    break
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                status, payload, extra_headers = await self._dispatch(method, path, body)
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and not self._closing)
+                writer.write(encode_response(status, payload, keep_alive, extra_headers))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._connections.discard(asyncio.current_task())
+            writer.close()
+
+    async def _dispatch(self, method, path, body):
+        """Routes a request; returns (status, payload, extra_headers)."""
+        if path == "/health":
+            if method != "GET":
+                return 405, {"error": "use GET"}, ()
+            return 200, self.stats(), ()
+        if path == "/metrics" and self.metrics is not None:
+            if method != "GET":
+                return 405, {"error": "use GET"}, ()
+            return 200, self.metrics(), ()
+        if path != "/chat":
+            return 404, {"error": f"unknown path {path}"}, ()
+        if method != "POST":
+            return 405, {"error": "use POST"}, ()
+
+        try:
+            request = json.loads(body.decode("utf8"))
+            text = request["text"]
+            session_id = str(request["session_id"])
+            tenant_id = request.get("tenant_id")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return 400, {"error": "expected a JSON object with 'session_id' and 'text'"}, ()
+        if not isinstance(text, str) or not text.strip():
+            return 400, {"error": "'text' must be a non-empty string"}, ()
+        args = (text, session_id)
+        if tenant_id is not None:
+            tenant_id = str(tenant_id)
+            if self.tenants is None or tenant_id not in self.tenants:
+                return 404, {"error": f"unknown tenant {tenant_id!r}"}, ()
+            args += (tenant_id,)
+
+        # --- Backpressure: refuse rather than queue without bound ---
+        if self._closing or self._pending >= self.max_pending:
+            self.rejected += 1
+            return 503, {"error": "server busy, retry later"}, (("Retry-After", "1"),)
+
+        self._pending += 1
+        self._idle.clear()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, self.process_turn, *args)
+        except Exception as e:
+            self.errors += 1
+            return 500, {"error": f"turn failed: {e}"}, ()
+        finally:
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.set()
+
+        self.served += 1
+        return 200, result, ()
+
+
+# --- 3. ENTRY POINT ---
+async def serve_until_stopped(server, sock=None):
+    """Runs the server until SIGINT/SIGTERM, then shuts it down gracefully."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: Ctrl+C arrives as KeyboardInterrupt instead
+            pass
+
+    await server.start(sock=sock)
+    print(f"Serving on http://{server.host}:{server.port}/chat (Ctrl+C to stop)")
+    try:
+        await stop.wait()
+    finally:
+        print("Shutting down: draining in-flight turns...")
+        await server.shutdown()
+        print(f"Server stopped. {server.stats()}")
+
+
+def serve(process_turn, host="127.0.0.1", port=8080, workers=4, max_pending=64,
+          metrics=None, health=None, tenants=None):
+    """Blocking helper used by `chatbot_app.py --serve`."""
+    server = ChatServer(process_turn, host=host, port=port, workers=workers,
+                        max_pending=max_pending, metrics=metrics, health=health,
+                        tenants=tenants)
+    try:
+        asyncio.run(serve_until_stopped(server))
+    except KeyboardInterrupt:
+        pass
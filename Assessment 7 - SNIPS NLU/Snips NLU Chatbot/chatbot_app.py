@@ -1,33 +1,126 @@
-import io
+import argparse
+import contextlib
+import functools
+import gc
 import json
-import random
-from snips_nlu import SnipsNLUEngine
-from snips_nlu.default_configs import CONFIG_EN
-
-# --- Global Session/Memory (The 'Context') ---
-# This dictionary stores temporary conversation data for the user.
-SESSION_CONTEXT = {
-    "last_room": None,
-    "user_name": "Valued User" # Default name
-}
-
-# --- 1. NLU ENGINE SETUP AND TRAINING (Same as before) ---
-def train_engine():
-    """Loads the dataset.json and trains the NLU engine."""
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from collections import Counter, namedtuple
+
+# snips_nlu and its scientific stack are imported lazily (engine_cache.load_engine),
+# only once an engine is actually loaded. --startup-profile reports from here.
+_IMPORTS_STARTED = time.perf_counter()
+from dialogue import DialogueManager, load_templates
+from engine_cache import (
+    CACHE_DIR, DATASET_FILE, format_training_report, load_engine, load_or_train_engine)
+from engine_registry import EngineRegistry
+from exact_matcher import ExactMatcher
+from intent_gate import IntentGate
+from hot_reload import DatasetWatcher, ModelHolder
+from parse_cache import ParseCache, normalize_utterance
+from pipeline_metrics import PIPELINE_STAGES, MetricsDumper, PipelineMetrics
+from session_store import SessionStore
+from transcript_logger import TranscriptLogger
+
+# --- Session/Memory Store (The 'Context') ---
+# Each conversation gets its own Session record (user_name, last_room), keyed by session id.
+SESSIONS = SessionStore(num_shards=16, ttl_seconds=1800.0, max_sessions=100_000)
+
+# Session id used by the interactive console loop. Its session lives in a store without
+# idle expiry: the console user is still there after a long pause, as before the store.
+CONSOLE_SESSION_ID = "console"
+CONSOLE_SESSIONS = SessionStore(num_shards=1, ttl_seconds=float("inf"), max_sessions=1)
+
+# Repeated commands ("lights on", "hi") are answered from this cache instead of re-parsing.
+PARSE_CACHE = ParseCache(max_size=1024, ttl_seconds=300.0)
+
+# The live model: engine + exact-match trie over the training utterances/synonyms
+# (exact hits skip engine.parse entirely) + fingerprint. Both are swapped together,
+# by train_engine() at startup and by the dataset watcher on hot reload.
+MODEL = ModelHolder()
+
+# Per-stage latency histograms (normalize, parse, dialogue, render) and per-intent counters.
+METRICS = PipelineMetrics()
+
+# Confidence gating (--gate-threshold P): classify first, fill slots only above P.
+# GATE_PARSE is what the parse caches call on a miss (None = plain engine.parse).
+GATE = None
+GATE_PARSE = None
+
+# Conversation transcripts (--transcript-dir DIR); turns are queued, a background thread writes them.
+TRANSCRIPT = None
+
+# Multi-tenant mode (--tenants FILE): tenant id -> persisted engine, loaded on first use.
+# Each tenant keeps its own parse cache, evicted together with its engine.
+TenantModel = namedtuple("TenantModel", "engine parse_cache")
+TENANTS = None
+
+def load_tenant_model(engine_dir):
+    return TenantModel(load_engine(engine_dir), ParseCache(max_size=256, ttl_seconds=300.0))
+
+def server_health():
+    """GET /health extras: live model status plus fast path, tenant registry and gate counters."""
+    health = MODEL.status()
+    if MODEL.current is not None:
+        health["exact_matcher"] = MODEL.current.matcher.stats()
+    if TENANTS is not None:
+        health["tenants"] = TENANTS.stats()
+    if GATE is not None:
+        health["intent_gate"] = GATE.stats()
+    return health
+
+# --- 1. NLU ENGINE SETUP AND TRAINING (Cached on disk) ---
+def train_engine(seed=None, train_workers=1, engine_dir=None, profile=None):
+    """Loads the NLU engine for dataset.json from the model cache, training it on a miss.
+
+    With a seed, training is reproducible and the per-intent slot fillers are
+    fitted by train_workers processes (same model for any worker count).
+    engine_dir loads a persisted snapshot (e.g. an --export-compact or
+    --export-mmap directory) as-is instead. The exact-match trie is always
+    built from the training dataset stored with the engine, never from the
+    local dataset.json. A StartupProfile, if given, records each step.
+    """
     try:
-        with io.open("dataset.json", encoding="utf8") as f:
-            custom_dataset = json.load(f)
-        
-        print("Starting NLU Engine training...")
-        # Suppress the DeprecationWarning for a cleaner output
-        import warnings
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=DeprecationWarning)
-            
-            nlu_engine = SnipsNLUEngine(config=CONFIG_EN)
-            nlu_engine = nlu_engine.fit(custom_dataset)
-        
-        print("Training complete. Assistant is online.")
+        if engine_dir and not os.path.isdir(engine_dir):
+            print(f"FATAL ERROR: engine snapshot '{engine_dir}' not found.")
+            return None
+        if profile is not None:
+            profile.import_heavy()
+
+        start = time.perf_counter()
+        if engine_dir:
+            nlu_engine = load_engine(engine_dir)
+            info = {"fingerprint": f"snapshot:{os.path.basename(os.path.normpath(engine_dir))}",
+                    "source": "snapshot", "path": engine_dir, "seconds": time.perf_counter() - start}
+        else:
+            nlu_engine, info = load_or_train_engine("dataset.json", seed=seed, workers=train_workers)
+        if profile is not None:
+            profile.add(f"engine ({info['source']})", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        # A snapshot exported without its training dataset gets no exact-match fast path:
+        # the local dataset.json may not be what it was trained on
+        training_dataset = os.path.join(info["path"], DATASET_FILE)
+        if os.path.exists(training_dataset):
+            matcher = ExactMatcher.from_file(training_dataset)
+        else:
+            print(f"Engine snapshot has no {DATASET_FILE}; exact-match fast path disabled.")
+            matcher = ExactMatcher({"intents": {}, "entities": {}})
+        if profile is not None:
+            profile.add("exact matcher", time.perf_counter() - start)
+        MODEL.swap(nlu_engine, matcher, info["fingerprint"])
+
+        if "report" in info:
+            print(format_training_report(info["report"]))
+        path_taken = {
+            "cache": "Loaded cached engine",
+            "snapshot": "Loaded engine snapshot",
+            "incremental": "Incrementally trained and cached engine",
+        }.get(info["source"], "Trained and cached engine")
+        print(f"{path_taken} {info['fingerprint']} in {info['seconds']:.2f}s. Assistant is online.")
         return nlu_engine
     except FileNotFoundError:
         print("FATAL ERROR: 'dataset.json' not found. Did you run 'snips-nlu generate-dataset'?")
@@ -36,108 +129,491 @@ def train_engine():
         print(f"An unexpected error occurred during training: {e}")
         return None
 
+# --- 1b. BATCH PARSING (replaying large utterance logs) ---
+# Engine inherited by forked parse workers; set right before the pool forks.
+_WORKER_ENGINE = None
+
+def _parse_chunk(chunk):
+    return [_WORKER_ENGINE.parse(text) for text in chunk]
+
+def parse_many(engine, utterances, workers=None, chunk_size=256, verbose=True):
+    """Parses many utterances across a forked process pool; results keep input order.
+
+    Duplicates are parsed once. Workers are forked after the engine is loaded, so the
+    model is shared copy-on-write instead of being reloaded or pickled per process.
+    Identical utterances share one result dict, so treat results as read-only.
+    """
+    global _WORKER_ENGINE
+    utterances = list(utterances)
+    unique = list(dict.fromkeys(utterances))
+    workers = workers or os.cpu_count() or 1
+    if "fork" not in multiprocessing.get_all_start_methods():
+        # e.g. Windows: spawned workers would have to reload the engine
+        workers = 1
+    workers = max(1, min(workers, -(-len(unique) // chunk_size)))
+
+    start = time.perf_counter()
+    if workers == 1:
+        results = [engine.parse(text) for text in unique]
+    else:
+        chunks = [unique[i:i + chunk_size] for i in range(0, len(unique), chunk_size)]
+        _WORKER_ENGINE = engine
+        # Keep the loaded model out of the GC's reach so its pages are not dirtied in workers
+        gc.freeze()
+        try:
+            with multiprocessing.get_context("fork").Pool(workers) as pool:
+                results = [res for part in pool.map(_parse_chunk, chunks) for res in part]
+        finally:
+            gc.unfreeze()
+            _WORKER_ENGINE = None
+    elapsed = time.perf_counter() - start
+
+    if verbose:
+        rate = len(unique) / elapsed if elapsed else float("inf")
+        print(f"parse_many: {len(utterances)} utterances ({len(unique)} unique) with "
+              f"{workers} worker(s) in {elapsed:.2f}s -> {rate:.0f} utt/s ({rate / workers:.0f} utt/s per worker)")
+
+    by_text = dict(zip(unique, results))
+    return [by_text[text] for text in utterances]
+
+def benchmark_parse_many(engine, utterances, worker_counts=(1, 2, 4, 8)):
+    """Prints parse_many throughput for each worker count."""
+    utterances = list(utterances)
+    print(f"\n--- parse_many throughput ({len(set(utterances))} unique utterances) ---")
+    print("workers\tseconds\tutt/s\tutt/s per worker")
+    for workers in worker_counts:
+        start = time.perf_counter()
+        parse_many(engine, utterances, workers=workers, verbose=False)
+        elapsed = time.perf_counter() - start
+        rate = len(set(utterances)) / elapsed if elapsed else float("inf")
+        print(f"{workers}\t{elapsed:.2f}\t{rate:.0f}\t{rate / workers:.0f}")
+
 # --- 2. ADVANCED DIALOGUE MANAGEMENT ---
-def get_bot_response(parsing_result):
-    """Processes the NLU output, manages context, and returns a creative response."""
-    
-    intent_name = parsing_result.get('intent', {}).get('intentName')
-    slots = parsing_result.get('slots', [])
+# Response wording lives in responses.json and is pre-compiled once at load time.
+DIALOGUE = DialogueManager(load_templates(os.path.join(os.path.dirname(os.path.abspath(__file__)), "responses.json")))
+
+@DIALOGUE.intent('turnLightOn', 'turnLightOff')
+def handle_lights(dialogue, intent_name, slots, session):
+    """Switches lights in the requested room, falling back to the last room of the session."""
+    # 1. Determine the target room: use the room from this input if provided, otherwise the last known room
+    target_room = slots.get('room') or session.last_room
     
-    # Helper to find a specific slot's resolved value
-    def find_slot(slot_name):
-        return next((s['value']['value'] for s in slots if s['slotName'] == slot_name), None)
+    if not target_room:
+        # 2. Missing slot: Prompt the user creatively
+        return dialogue.say("light.missing_room")
+
+    # 3. Fulfill the command and update context for the next turn
+    session.last_room = target_room
+    action = "ON" if intent_name == 'turnLightOn' else "OFF"
+    return dialogue.say("light.done", user_name=session.user_name, action=action, room=target_room)
+
+@DIALOGUE.intent('greet')
+def handle_greet(dialogue, intent_name, slots, session):
+    return dialogue.say("greet", user_name=session.user_name)
+
+def get_bot_response(parsing_result, session):
+    """Processes the NLU output, manages the session's context, and returns a creative response."""
+    return DIALOGUE.respond(parsing_result, session)
+
+
+# --- 3. ONE CHAT TURN (shared by the console loop, batch mode and the HTTP server) ---
+def _cache_hit(parsing_result):
+    # A cached gated result ran no classification or slot filling this turn,
+    # so the timings of the parse that filled the entry are not reported again
+    gate = parsing_result.get('gate')
+    if gate is None:
+        return parsing_result
+    return dict(parsing_result, gate={"passed": gate['passed'], "cached": True})
+
+def _parse(text, tenant_id=None):
+    if tenant_id is not None:
+        if TENANTS is None:
+            raise KeyError("multi-tenant mode is off (start with --tenants)")
+        tenant = TENANTS.get(tenant_id)
+        return tenant.parse_cache.parse(tenant.engine, text, GATE_PARSE, on_hit=_cache_hit)
+    # One snapshot per turn: a concurrent hot swap cannot mix old and new models
+    model = MODEL.current
+    return model.matcher.parse(text, functools.partial(PARSE_CACHE.parse, model.engine,
+                                                       parse_fn=GATE_PARSE, on_hit=_cache_hit))
+
+def _render_turn(parsing_result, response, session_id):
+    intent = parsing_result.get('intent') or {}
+    turn = {
+        "session_id": session_id,
+        "intent": intent.get('intentName'),
+        "probability": intent.get('probability'),
+        "slots": [{"slotName": s['slotName'], "value": s['value']['value']}
+                  for s in parsing_result.get('slots', [])],
+        "response": response,
+    }
+    gate = parsing_result.get('gate')
+    if gate is not None:
+        # Gated parse: report the shortlist and the slot filling time it saved
+        # (a parse cache hit saved the whole parse instead, and says so)
+        turn["top_intents"] = [{"intent": i['intentName'], "probability": i['probability']}
+                               for i in parsing_result['intents']]
+        if gate.get('cached'):
+            turn["parse_cached"] = True
+        else:
+            turn["parse_saved_ms"] = gate['saved_ms']
+    return turn
+
+def _get_session(session_id, tenant_id):
+    if tenant_id is None and session_id == CONSOLE_SESSION_ID:
+        return CONSOLE_SESSIONS.get(session_id)
+    # Tenants may reuse session ids, so their sessions are keyed by (tenant, session)
+    return SESSIONS.get(session_id if tenant_id is None else (tenant_id, session_id))
+
+def _handle_message_plain(user_input, session_id, tenant_id=None):
+    """Parses one message for a session and returns the bot turn as a JSON-ready dict."""
+    text = normalize_utterance(user_input)
+    parsing_result = _parse(text, tenant_id)
+    response = get_bot_response(parsing_result, _get_session(session_id, tenant_id))
+    turn = _render_turn(parsing_result, response, session_id)
+    if TRANSCRIPT is not None:
+        TRANSCRIPT.log(session_id, user_input, turn, tenant_id=tenant_id)
+    return turn
+
+def _handle_message_timed(user_input, session_id, tenant_id=None):
+    """Same as _handle_message_plain, recording each stage into METRICS."""
+    clock = time.perf_counter
+    t0 = clock()
+    text = normalize_utterance(user_input)
+    t1 = clock()
+    parsing_result = _parse(text, tenant_id)
+    t2 = clock()
+    response = get_bot_response(parsing_result, _get_session(session_id, tenant_id))
+    t3 = clock()
+    turn = _render_turn(parsing_result, response, session_id)
+    t4 = clock()
+
+    # Stage order matches PIPELINE_STAGES: normalize, parse, dialogue, render
+    durations = (t1 - t0, t2 - t1, t3 - t2, t4 - t3)
+    METRICS.record_turn(turn["intent"], durations)
+    if TRANSCRIPT is not None:
+        TRANSCRIPT.log(session_id, user_input, turn, durations, tenant_id)
+    return turn
+
+def enable_metrics(enabled=True):
+    """Switches handle_message between the timed and the plain pipeline.
+
+    Disabling rebinds the function itself, so there is no per-turn cost at all.
+    """
+    global handle_message
+    handle_message = _handle_message_timed if enabled else _handle_message_plain
 
-    # --- NLU Action: Extract new room from current input ---
-    new_room = find_slot('room')
+# Instrumentation is on by default; CHATBOT_METRICS=0 or --no-metrics turns it off.
+handle_message = _handle_message_timed if os.environ.get("CHATBOT_METRICS", "1") != "0" else _handle_message_plain
+
+
+# --- 4. THE INTERACTIVE LOOP ---
+def chat_loop():
+    """Runs the console conversation for the single 'console' session."""
+    session = _get_session(CONSOLE_SESSION_ID, None)
+    print("\n--- START ADVANCED CHAT ---")
+    print(f"Bot: Hello! What is your name? (Type 'skip' to use the default)")
     
-    # --- Intent Handling Logic with Context ---
+    # Get user name at start for a personal touch
+    name_input = input("You: ")
+    if name_input.lower() not in ["skip", "quit", "exit"]:
+         # Simple extraction of the first word as a name
+         session.user_name = name_input.split()[0]
+         print(f"Bot: Pleasure to meet you, {session.user_name}! Let's get started.")
+    else:
+         print(f"Bot: Alright. Type 'quit' or 'exit' anytime to stop.")
+
     
-    if intent_name == 'turnLightOn' or intent_name == 'turnLightOff':
-        
-        # 1. Determine the target room: use new_room if provided, otherwise use the last known room
-        target_room = new_room if new_room else SESSION_CONTEXT['last_room']
-        
-        action = "ON" if intent_name == 'turnLightOn' else "OFF"
-        
-        if target_room:
-            # 2. Fulfill the command
-            
-            # Update context for the next turn
-            SESSION_CONTEXT['last_room'] = target_room 
+    # Main conversation loop
+    while True:
+        try:
+            user_input = input(f"\n{session.user_name}: ")
+        except EOFError:
+            break
+
+        if user_input.lower() in ["quit", "exit", "stop"]:
+            print("Bot: Shutting down systems. Goodbye!")
+            break
             
-            # Creative Responses
-            responses = [
-                f"Roger that, {SESSION_CONTEXT['user_name']}. Command executed: lights {action} in the **{target_room}**.",
-                f"Confirmed. The lighting is now set to {action} in the **{target_room}**.",
-                f"Consider it done. **{target_room}** illumination set to {action}."
-            ]
-            return random.choice(responses)
+        # Parse the input and get the response (refreshing the session's idle timer)
+        turn = handle_message(user_input, CONSOLE_SESSION_ID)
         
+        # Print the response
+        print(f"Assistant: {turn['response']}")
+
+    print(f"Parse cache stats: {PARSE_CACHE.stats()}")
+    print(f"Fast path stats: {MODEL.current.matcher.stats()}")
+    if GATE is not None:
+        print(f"Intent gate stats: {GATE.stats()}")
+
+
+# --- 5. STREAMING BATCH MODE (JSONL in, JSONL out) ---
+BATCH_SESSION_ID = "batch"
+
+def run_batch(input_path, output_path=None):
+    """Streams {"text", "session_id"?} records through the pipeline, one JSONL turn per line.
+
+    Records are processed one at a time, so memory does not grow with the input size.
+    input_path / output_path may be "-" (or None for the output) to use stdin / stdout.
+    A summary goes to stderr so stdout stays valid JSONL.
+    """
+    intents = Counter()
+    turns = errors = 0
+    start = time.perf_counter()
+
+    with contextlib.ExitStack() as stack:
+        source = sys.stdin if input_path == "-" else stack.enter_context(open(input_path, encoding="utf8"))
+        if output_path in (None, "-"):
+            sink = sys.stdout
         else:
-            # 3. Missing slot: Prompt the user creatively
-            return random.choice([
-                "I hear the intent, but which room needs attention?",
-                "Could you specify the room? My internal map is feeling fuzzy.",
-                "Room parameter missing. Which space should I target?"
-            ])
-
-    elif intent_name == 'greet':
-        # Introduce a creative variant
-        greetings = [
-            f"Hello, {SESSION_CONTEXT['user_name']}! Your home assistant is ready.",
-            "Greetings! I am active and awaiting your command.",
-            "A fine day! What can I control for you today?"
-        ]
-        return random.choice(greetings)
-
-    # --- Fallback/Error Handling ---
-    elif intent_name is None:
-        return random.choice([
-            "My apologies, that command is outside my current programming. Try a light or temperature command.",
-            "I seem to be having trouble processing that. Can you rephrase?",
-            "Unrecognized query. I'm limited to smart home functions for now."
-        ])
-        
-    else:
-        # Catch-all
-        return f"I recognized the intent '{intent_name}', but my response module for that is still in beta."
+            sink = stack.enter_context(open(output_path, "w", encoding="utf8", buffering=1 << 20))
+
+        for line_no, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                text = record["text"]
+                session_id = str(record.get("session_id", BATCH_SESSION_ID))
+                turn = handle_message(text, session_id, record.get("tenant_id"))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                errors += 1
+                sink.write(json.dumps({"line": line_no, "error": f"{type(e).__name__}: {e}"}) + "\n")
+                continue
+            turns += 1
+            intents[turn["intent"]] += 1
+            # The turn may still be queued for the transcript, so it is copied, not mutated
+            sink.write(json.dumps(dict(turn, line=line_no)) + "\n")
+        sink.flush()
+
+    elapsed = time.perf_counter() - start
+    fallbacks = intents.get(None, 0)
+    print("\n--- Batch summary ---", file=sys.stderr)
+    print(f"Turns: {turns} ({errors} malformed record(s) skipped) in {elapsed:.2f}s "
+          f"-> {turns / elapsed if elapsed else 0.0:.1f} turns/s", file=sys.stderr)
+    print(f"Fallback rate: {fallbacks / turns if turns else 0.0:.4f} ({fallbacks}/{turns})", file=sys.stderr)
+    print("Intent distribution:", file=sys.stderr)
+    for intent_name, count in intents.most_common():
+        print(f"  {str(intent_name):<24}{count:>8}  {count / turns:.2%}", file=sys.stderr)
+    matcher = MODEL.current.matcher.stats()
+    print(f"Fast path: {matcher['hits']}/{matcher['hits'] + matcher['misses']} parse(s) answered "
+          f"by the exact matcher ({matcher['hit_rate']:.2%}), ~{matcher['est_saved_seconds']:.2f}s saved",
+          file=sys.stderr)
+    if GATE is not None:
+        gate = GATE.stats()
+        print(f"Intent gate: {gate['gated']}/{gate['requests']} parse(s) skipped slot filling, "
+              f"~{gate['saved_seconds']:.2f}s saved", file=sys.stderr)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Snips NLU smart-home chatbot")
+    parser.add_argument("--serve", action="store_true",
+                        help="serve POST /chat over HTTP instead of the console loop")
+    parser.add_argument("--host", default="127.0.0.1", help="HTTP bind address (--serve)")
+    parser.add_argument("--port", type=int, default=8080, help="HTTP port (--serve)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="parser threads used by the HTTP server (--serve)")
+    parser.add_argument("--prefork", type=int, metavar="N",
+                        help="serve from N forked worker processes sharing the loaded engine (--serve); "
+                             "session context lives in the worker that served the turn, so a "
+                             "session must stick to one connection or a sticky (session_id-hashed) "
+                             "load balancer")
+    parser.add_argument("--memory-report", type=float, metavar="SECONDS",
+                        help="print per-worker RSS/shared memory every SECONDS (--prefork)")
+    parser.add_argument("--max-pending", type=int, default=64,
+                        help="queued turns before the server answers 503 (--serve)")
+    parser.add_argument("--parse-bench", metavar="FILE",
+                        help="benchmark parse_many over a file with one utterance per line")
+    parser.add_argument("--export-compact", metavar="DIR",
+                        help="write a compact copy of the trained engine (unused resources stripped) and exit")
+    parser.add_argument("--export-check", metavar="FILE",
+                        help="extra utterances (one per line) that must parse the same after an export")
+    parser.add_argument("--export-mmap", metavar="DIR",
+                        help="write the trained engine with memory-mapped intent weights (load with --engine-dir) and exit")
+    parser.add_argument("--batch", metavar="INPUT",
+                        help="stream a JSONL file ('-' for stdin) of {\"text\", \"session_id\"} records")
+    parser.add_argument("--output", metavar="FILE",
+                        help="JSONL output file for --batch (default: stdout)")
+    parser.add_argument("--engine-dir", metavar="DIR",
+                        help="load this persisted engine snapshot as-is (no dataset hashing or training); "
+                             "the exact-match fast path uses the training dataset stored in it, if any")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="print an import-time and load-time breakdown of the startup")
+    parser.add_argument("--seed", type=int,
+                        help="fixed training seed (reproducible models, enables --train-workers)")
+    parser.add_argument("--train-workers", type=int, default=1,
+                        help="processes fitting the per-intent slot fillers (needs --seed, 0 = all cores)")
+    parser.add_argument("--watch", action="store_true",
+                        help="retrain in the background and hot-swap the engine when dataset.json changes")
+    parser.add_argument("--watch-interval", type=float, default=2.0,
+                        help="seconds between dataset.json checks (--watch)")
+    parser.add_argument("--tenants", metavar="FILE",
+                        help="JSON map of tenant id -> persisted engine dir; turns may then carry a tenant_id")
+    parser.add_argument("--max-tenant-engines", type=int, default=8,
+                        help="tenant engines kept in memory before LRU eviction (--tenants)")
+    parser.add_argument("--max-tenant-mb", type=float,
+                        help="size budget of the resident tenant engines in MB (--tenants)")
+    parser.add_argument("--gate-threshold", type=float, metavar="P",
+                        help="classify first and skip slot filling when the top intent scores below P")
+    parser.add_argument("--top-k", type=int, default=3,
+                        help="intents (with probabilities) reported per turn when gating")
+    parser.add_argument("--transcript-dir", metavar="DIR",
+                        help="log every turn to rotated, gzip-compressed JSONL segments in DIR")
+    parser.add_argument("--transcript-segment-mb", type=float, default=16.0,
+                        help="uncompressed size at which a transcript segment is rotated")
+    parser.add_argument("--no-metrics", action="store_true",
+                        help="disable per-stage latency instrumentation (zero overhead)")
+    parser.add_argument("--metrics-out", metavar="FILE",
+                        help="write metrics on exit and on SIGUSR1 (*.json = JSON snapshot, else Prometheus text); "
+                             "with --prefork each worker writes its own FILE with .worker<slot> "
+                             "before the extension")
+    args = parser.parse_args()
+    if args.prefork and args.watch:
+        # The watcher would only swap the master's model, never the workers'
+        parser.error("--watch cannot be combined with --prefork")
+    if args.engine_dir and args.watch:
+        # The snapshot is served as-is; a dataset.json change would swap in a retrained model
+        parser.error("--watch cannot be combined with --engine-dir")
+    return args
+
+
+def _training_dataset(args):
+    """The dataset copy stored with the live engine, or None (older snapshots)."""
+    engine_dir = args.engine_dir or os.path.join(CACHE_DIR, MODEL.current.fingerprint)
+    path = os.path.join(engine_dir, DATASET_FILE)
+    return path if os.path.exists(path) else None
+
+def _export_check_utterances(args):
+    """Every dataset.json utterance, plus the --export-check file if given."""
+    with open("dataset.json", encoding="utf8") as f:
+        check = ["".join(chunk["text"] for chunk in utterance["data"])
+                 for intent in json.load(f)["intents"].values()
+                 for utterance in intent["utterances"]]
+    if args.export_check:
+        with open(args.export_check, encoding="utf8") as f:
+            check += [line.strip() for line in f if line.strip()]
+    return check
+
+
+def _start_transcript(args):
+    global TRANSCRIPT
+    TRANSCRIPT = TranscriptLogger(args.transcript_dir, timing_fields=PIPELINE_STAGES,
+                                  max_segment_bytes=int(args.transcript_segment_mb * (1 << 20)))
+
+def _close_transcript():
+    # Flush-on-shutdown: every queued turn reaches the transcript before exit
+    if TRANSCRIPT is not None:
+        TRANSCRIPT.close()
+        print(f"Transcript closed: {TRANSCRIPT.stats()}", file=sys.stderr)
+
+
+def _worker_metrics_path(path, slot):
+    # metrics.json -> metrics.worker0.json: the extension still picks the format
+    root, ext = os.path.splitext(path)
+    return f"{root}.worker{slot}{ext}"
+
+
+def _init_prefork_worker(args, slot):
+    if args.transcript_dir:
+        _start_transcript(args)
+    if args.metrics_out and not args.no_metrics:
+        # The master forwards SIGUSR1; each worker dumps only the turns it served
+        signal.signal(signal.SIGUSR1, MetricsDumper(
+            METRICS, _worker_metrics_path(args.metrics_out, slot)).start().request)
+
+
+def _exit_prefork_worker(args, slot):
+    _close_transcript()
+    if args.metrics_out and not args.no_metrics:
+        path = _worker_metrics_path(args.metrics_out, slot)
+        METRICS.write(path)
+        print(f"Metrics written to {path}", file=sys.stderr)
 
 
-# --- 3. THE INTERACTIVE LOOP ---
 if __name__ == "__main__":
-    
-    engine = train_engine()
+    args = parse_args()
+    if args.no_metrics:
+        enable_metrics(False)
+    elif args.metrics_out and hasattr(signal, "SIGUSR1") and not (args.serve and args.prefork):
+        # `kill -USR1 <pid>` dumps the current metrics without stopping the bot; the
+        # handler only flags the request, the file is written by a helper thread
+        signal.signal(signal.SIGUSR1, MetricsDumper(METRICS, args.metrics_out).start().request)
+
+    profile = None
+    if args.startup_profile:
+        from startup_profile import StartupProfile
+        profile = StartupProfile(started=_IMPORTS_STARTED)
+        profile.add("app modules + templates", time.perf_counter() - _IMPORTS_STARTED)
+
+    if args.batch and args.output in (None, "-"):
+        # Keep stdout clean for the JSONL stream: startup messages go to stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            engine = train_engine(args.seed, args.train_workers, args.engine_dir, profile)
+    else:
+        engine = train_engine(args.seed, args.train_workers, args.engine_dir, profile)
+    if profile is not None:
+        profile.print()
     
     if engine:
-        print("\n--- START ADVANCED CHAT ---")
-        print(f"Bot: Hello! What is your name? (Type 'skip' to use the default)")
-        
-        # Get user name at start for a personal touch
-        name_input = input("You: ")
-        if name_input.lower() not in ["skip", "quit", "exit"]:
-             # Simple extraction of the first word as a name
-             SESSION_CONTEXT['user_name'] = name_input.split()[0]
-             print(f"Bot: Pleasure to meet you, {SESSION_CONTEXT['user_name']}! Let's get started.")
-        else:
-             print(f"Bot: Alright. Type 'quit' or 'exit' anytime to stop.")
+        if args.gate_threshold is not None:
+            GATE = IntentGate(threshold=args.gate_threshold, top_k=args.top_k)
+            GATE_PARSE = GATE.parse
+        if args.transcript_dir and not (args.serve and args.prefork):
+            # Pre-fork workers start their own writer thread (threads do not survive a fork)
+            _start_transcript(args)
+        if args.tenants:
+            TENANTS = EngineRegistry.from_file(
+                args.tenants, load_tenant_model, max_engines=args.max_tenant_engines,
+                max_bytes=int(args.max_tenant_mb * (1 << 20)) if args.max_tenant_mb else None)
+            print(f"Multi-tenant mode: {len(TENANTS.engine_dirs)} tenant(s), "
+                  f"up to {args.max_tenant_engines} resident engine(s).")
+        if args.watch:
+            watcher = DatasetWatcher(MODEL, "dataset.json", poll_seconds=args.watch_interval,
+                                     seed=args.seed, train_workers=args.train_workers)
+            watcher.start()
 
-        
-        # Main conversation loop
-        while True:
-            try:
-                user_input = input(f"\n{SESSION_CONTEXT['user_name']}: ")
-            except EOFError:
-                break
-
-            if user_input.lower() in ["quit", "exit", "stop"]:
-                print("Bot: Shutting down systems. Goodbye!")
-                break
-                
-            # Parse the input
-            parsing_result = engine.parse(user_input)
-            
-            # Get the response
-            response = get_bot_response(parsing_result)
-            
-            # Print the response
-            print(f"Assistant: {response}")
\ No newline at end of file
+        try:
+            if args.export_compact:
+                from compact_export import export_compact_engine, format_export_report
+                print(format_export_report(export_compact_engine(engine, args.export_compact,
+                                                                 _export_check_utterances(args),
+                                                                 _training_dataset(args))))
+            elif args.export_mmap:
+                from mmap_weights import export_mmap_engine, format_mmap_report
+                print(format_mmap_report(export_mmap_engine(engine, args.export_mmap,
+                                                            _export_check_utterances(args),
+                                                            _training_dataset(args))))
+            elif args.batch:
+                run_batch(args.batch, args.output)
+            elif args.parse_bench:
+                with open(args.parse_bench, encoding="utf8") as f:
+                    benchmark_parse_many(engine, [line.strip() for line in f if line.strip()])
+            elif args.serve and args.prefork:
+                from prefork_server import PreforkServer
+                if args.prefork > 1:
+                    print(f"WARNING: session context (user name, last room) is kept per worker; "
+                          f"route each session_id to one of the {args.prefork} workers "
+                          f"(keep-alive connection or sticky load balancer) or turns will lose it.",
+                          file=sys.stderr)
+                PreforkServer(handle_message, host=args.host, port=args.port,
+                              workers=args.prefork, threads=args.workers,
+                              max_pending=args.max_pending,
+                              metrics=None if args.no_metrics else METRICS.to_prometheus,
+                              health=server_health, tenants=TENANTS,
+                              worker_init=lambda slot: _init_prefork_worker(args, slot),
+                              worker_exit=lambda slot: _exit_prefork_worker(args, slot),
+                              report_seconds=args.memory_report).run()
+            elif args.serve:
+                from chat_server import serve
+                serve(handle_message, host=args.host, port=args.port,
+                      workers=args.workers, max_pending=args.max_pending,
+                      metrics=None if args.no_metrics else METRICS.to_prometheus,
+                      health=server_health, tenants=TENANTS)
+            else:
+                chat_loop()
+        finally:
+            _close_transcript()
+
+        # Pre-fork workers write their own files; the master served no turns
+        if args.metrics_out and not args.no_metrics and not (args.serve and args.prefork):
+            METRICS.write(args.metrics_out)
+            print(f"Metrics written to {args.metrics_out}", file=sys.stderr)
\ No newline at end of file
@@ -0,0 +1,170 @@
+# ====================================================================
+# compact_export.py: Writes a slimmed copy of a trained engine for serving
+# A persisted engine ships whole language resources: the full word
+# cluster tables and the noise corpus (only used while fitting the
+# intent classifier). The compact export keeps only the cluster entries
+# whose cluster ids carry weight in the trained models and drops the
+# noise file, then checks that parse results are unchanged.
+# ====================================================================
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+from snips_nlu import SnipsNLUEngine
+
+from engine_cache import DATASET_FILE
+
+RESOURCES_DIR = "resources"
+
+
+# --- 1. WHAT THE TRAINED MODELS REFERENCE ---
+def referenced_word_clusters(engine):
+    """Returns {cluster_name: cluster ids the trained models can use}.
+
+    A word whose cluster id never appears in a CRF feature weight or in the
+    intent classifier's vocabulary contributes nothing to a parse, so
+    dropping it from the table does not change any result.
+    """
+    referenced = defaultdict(set)
+    for parser in engine.intent_parsers:
+        # CRF attributes look like "word_cluster_<name>[+1]:<cluster id>"
+        for slot_filler in (getattr(parser, "slot_fillers", None) or {}).values():
+            feature_names = {f"word_cluster_{factory.cluster_name}": factory.cluster_name
+                             for factory in slot_filler.features_factories
+                             if hasattr(factory, "cluster_name")}
+            if not feature_names or slot_filler.crf_model is None:
+                continue
+            for attribute, _label in slot_filler.crf_model.state_features_:
+                name, _, value = attribute.partition(":")
+                cluster_name = feature_names.get(name.split("[")[0])
+                if cluster_name is not None:
+                    referenced[cluster_name].add(value)
+
+        # The intent featurizer appends cluster ids to the utterance before tf-idf
+        featurizer = getattr(getattr(parser, "intent_classifier", None), "featurizer", None)
+        tfidf = getattr(featurizer, "tfidf_vectorizer", None)
+        if tfidf is not None and tfidf.config.word_clusters_name:
+            referenced[tfidf.config.word_clusters_name].update(tfidf.vocabulary)
+    return referenced
+
+
+# --- 2. SLIMMING A PERSISTED ENGINE ---
+def _tree_size(path):
+    return sum(os.path.getsize(os.path.join(dirpath, name))
+               for dirpath, _, filenames in os.walk(path) for name in filenames)
+
+
+def _slim_resources(resources_dir, referenced):
+    """Rewrites one language's resources in place; returns {resource: bytes saved}."""
+    saved = {}
+    metadata_path = os.path.join(resources_dir, "metadata.json")
+    with open(metadata_path, encoding="utf8") as f:
+        metadata = json.load(f)
+
+    if metadata.get("noise"):
+        noise_path = os.path.join(resources_dir, metadata["noise"] + ".txt")
+        if os.path.exists(noise_path):
+            saved["noise"] = os.path.getsize(noise_path)
+            os.remove(noise_path)
+        metadata["noise"] = None
+
+    for cluster_name in metadata.get("word_clusters") or []:
+        path = os.path.join(resources_dir, "word_clusters", cluster_name + ".txt")
+        keep = referenced.get(cluster_name, set())
+        before = os.path.getsize(path)
+        with open(path, encoding="utf8") as f:
+            lines = [line for line in f if line.rstrip("\n").split("\t")[-1] in keep]
+        with open(path, "w", encoding="utf8") as f:
+            f.writelines(lines)
+        saved[f"word_clusters/{cluster_name}"] = before - os.path.getsize(path)
+
+    with open(metadata_path, "w", encoding="utf8") as f:
+        json.dump(metadata, f, indent=2, sort_keys=True)
+    return saved
+
+
+def _measure_load(engine_dir):
+    """Returns (engine, load seconds, bytes allocated by the load)."""
+    start = time.perf_counter()
+    SnipsNLUEngine.from_path(engine_dir)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        engine = SnipsNLUEngine.from_path(engine_dir)
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return engine, seconds, allocated
+
+
+# --- 3. EXPORT ---
+def export_compact_engine(engine, out_dir, check_utterances=(), dataset_path=None):
+    """Persists a compact copy of a trained engine to out_dir and returns a report.
+
+    The compact engine is re-loaded and must parse every check utterance
+    exactly like the full one; otherwise nothing is written and ValueError
+    is raised. The compact engine cannot be re-fitted (no noise corpus).
+    dataset_path, the engine's training dataset, is copied in for the
+    exact-match fast path.
+    """
+    if os.path.exists(out_dir):
+        raise FileExistsError(f"{out_dir} already exists")
+    staging_root = tempfile.mkdtemp(prefix="compact-", dir=os.path.dirname(os.path.abspath(out_dir)))
+    try:
+        full_dir = os.path.join(staging_root, "full")
+        slim_dir = os.path.join(staging_root, "slim")
+        engine.persist(full_dir)
+        shutil.copytree(full_dir, slim_dir)
+
+        referenced = referenced_word_clusters(engine)
+        saved = {}
+        resources_root = os.path.join(slim_dir, RESOURCES_DIR)
+        if os.path.isdir(resources_root):
+            for language in os.listdir(resources_root):
+                saved.update(_slim_resources(os.path.join(resources_root, language), referenced))
+
+        full_engine, full_seconds, full_bytes = _measure_load(full_dir)
+        slim_engine, slim_seconds, slim_bytes = _measure_load(slim_dir)
+        mismatches = [text for text in check_utterances
+                      if slim_engine.parse(text) != full_engine.parse(text)]
+        if mismatches:
+            raise ValueError(f"compact engine parses {len(mismatches)} utterance(s) differently, "
+                             f"e.g. {mismatches[0]!r}")
+
+        report = {
+            "path": out_dir,
+            "full_bytes": _tree_size(full_dir),
+            "compact_bytes": _tree_size(slim_dir),
+            "saved_by_resource": saved,
+            "load_seconds": {"full": full_seconds, "compact": slim_seconds},
+            "load_allocated_bytes": {"full": full_bytes, "compact": slim_bytes},
+            "checked_utterances": len(check_utterances),
+        }
+        if dataset_path is not None:
+            shutil.copyfile(dataset_path, os.path.join(slim_dir, DATASET_FILE))
+        os.rename(slim_dir, out_dir)
+        return report
+    finally:
+        shutil.rmtree(staging_root, ignore_errors=True)
+
+
+def format_export_report(report):
+    saved = report["full_bytes"] - report["compact_bytes"]
+    lines = [
+        f"Compact engine written to {report['path']}:",
+        f"  size: {report['full_bytes'] / 1e6:.2f} MB -> {report['compact_bytes'] / 1e6:.2f} MB "
+        f"({saved:,} bytes saved)",
+    ]
+    for resource, n in sorted(report["saved_by_resource"].items()):
+        lines.append(f"    {resource}: {n:,} bytes")
+    lines.append(f"  load time: {report['load_seconds']['full']:.2f}s -> "
+                 f"{report['load_seconds']['compact']:.2f}s")
+    lines.append(f"  memory allocated by load: {report['load_allocated_bytes']['full'] / 1e6:.1f} MB -> "
+                 f"{report['load_allocated_bytes']['compact'] / 1e6:.1f} MB")
+    lines.append(f"  identical parses on {report['checked_utterances']} check utterance(s)")
+    return "\n".join(lines)
@@ -0,0 +1,93 @@
+# ====================================================================
+# dialogue.py: Table-driven dialogue layer
+# Intent handlers are registered in a dict (one lookup per turn instead
+# of an if/elif chain), slots are indexed by slotName once per parsing
+# result, and response templates are loaded from a data file and split
+# into literal/field parts once at load time.
+# ====================================================================
+
+import io
+import json
+import random
+from string import Formatter
+
+
+# --- 1. PRE-COMPILED TEMPLATES ---
+class Template:
+    """A response template split once into literal text and field names."""
+
+    __slots__ = ("source", "_parts", "_static")
+
+    def __init__(self, source):
+        self.source = source
+        parts = []
+        for literal, field, spec, conversion in Formatter().parse(source):
+            if spec or conversion:
+                raise ValueError(f"Template {source!r}: format specs are not supported")
+            if literal:
+                parts.append((True, literal))
+            if field is not None:
+                parts.append((False, field))
+        self._parts = tuple(parts)
+        # Templates without fields are returned as-is, no rendering needed
+        self._static = source.replace("{{", "{").replace("}}", "}") \
+            if all(is_literal for is_literal, _ in parts) else None
+
+    def render(self, fields):
+        if self._static is not None:
+            return self._static
+        return "".join(text if is_literal else str(fields[text])
+                       for is_literal, text in self._parts)
+
+
+def load_templates(path):
+    """Loads {key: [template, ...]} from a JSON file and compiles every template."""
+    with io.open(path, encoding="utf8") as f:
+        raw = json.load(f)
+    return {key: tuple(Template(t) for t in variants) for key, variants in raw.items()}
+
+
+# --- 2. SLOT INDEX ---
+def index_slots(slots):
+    """Maps slotName -> resolved value, keeping the first value of each slot."""
+    index = {}
+    for slot in slots:
+        index.setdefault(slot['slotName'], slot['value']['value'])
+    return index
+
+
+# --- 3. DISPATCH TABLE ---
+class DialogueManager:
+    """Routes a parsing result to the handler registered for its intent.
+
+    Handlers have the signature handler(dialogue, intent_name, slots, session) and
+    return the response text; `slots` is the dict built by index_slots().
+    Results whose intent is None go to the "fallback" template, and intents
+    without a handler go to the "unhandled" template.
+    """
+
+    def __init__(self, templates, rng=random):
+        self.templates = templates
+        self.handlers = {}
+        self._rng = rng
+
+    def intent(self, *intent_names):
+        """Decorator registering a handler for one or more intents."""
+        def register(handler):
+            for name in intent_names:
+                self.handlers[name] = handler
+            return handler
+        return register
+
+    def say(self, key, **fields):
+        """Renders a random variant of the template registered under key."""
+        return self._rng.choice(self.templates[key]).render(fields)
+
+    def respond(self, parsing_result, session):
+        intent_name = (parsing_result.get('intent') or {}).get('intentName')
+        if intent_name is None:
+            return self.say("fallback")
+        handler = self.handlers.get(intent_name)
+        if handler is None:
+            return self.say("unhandled", intent=intent_name)
+        return handler(self, intent_name, index_slots(parsing_result.get('slots', [])), session)
@@ -0,0 +1,346 @@
+# ====================================================================
+# engine_cache.py: On-disk cache of trained Snips NLU engines
+# A trained engine is persisted under a directory named after a content
+# hash of dataset.json + the engine config, so restarts only pay the
+# load time instead of a full fit.
+# Each cached engine also stores a training manifest (one hash per intent
+# and per entity). On a cache miss the new dataset is diffed against the
+# latest fit: slot fillers of unchanged intents are reused and only the
+# changed intents + the shared intent classifier are retrained.
+# With a fixed seed, the slot fillers to (re)train are fitted in a process
+# pool (see parallel_training.py); the result does not depend on the
+# number of workers.
+# snips_nlu (and numpy/scipy/sklearn behind it) is only imported when an
+# engine is actually loaded or trained; fingerprinting a dataset is cheap.
+# ====================================================================
+
+import functools
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import warnings
+
+CACHE_DIR = ".engine_cache"
+MANIFEST_FILE = "training_manifest.json"
+DATASET_FILE = "training_dataset.json"  # the exact bytes the engine was fitted on
+LATEST_FILE = "latest"
+PROBABILISTIC_PARSER = "probabilistic_intent_parser"
+
+
+# --- 1. FINGERPRINTING ---
+@functools.lru_cache(maxsize=None)
+def snips_version():
+    """Installed snips-nlu version, read from the package metadata (no import)."""
+    from importlib import metadata
+
+    try:
+        return metadata.version("snips-nlu")
+    except metadata.PackageNotFoundError:
+        from snips_nlu import __version__
+        return __version__
+
+
+def _config_key(config):
+    # config=None stands for snips' default English config, which only changes
+    # with the snips-nlu version (hashed separately), so it is not expanded here
+    return "CONFIG_EN" if config is None else config
+
+
+def _resolve_config(config):
+    if config is None:
+        from snips_nlu.default_configs import CONFIG_EN
+        return CONFIG_EN
+    return config
+
+
+def _digest(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode("utf8")).hexdigest()[:16]
+
+
+def engine_fingerprint(dataset_bytes, config=None, seed=None):
+    """Returns a short content hash identifying a (dataset, config, seed) triple."""
+    digest = hashlib.sha256()
+    digest.update(dataset_bytes)
+    digest.update(json.dumps(_config_key(config), sort_keys=True, default=str).encode("utf8"))
+    if seed is not None:
+        digest.update(f"seed={seed}".encode("utf8"))
+    # A new snips-nlu release may not be able to load older models
+    digest.update(snips_version().encode("utf8"))
+    return digest.hexdigest()[:16]
+
+
+def training_manifest(dataset, config=None, seed=None):
+    """Hashes every entity, and every intent together with the entities its slots use.
+
+    An intent's slot filler only depends on its own utterances, the values of the
+    entities it references and the config, so an unchanged intent hash means its
+    trained slot filler can be reused as-is.
+    """
+    entities = dataset.get("entities", {})
+    entity_hashes = {name: _digest(entity) for name, entity in entities.items()}
+    intent_hashes = {}
+    for name, intent in dataset.get("intents", {}).items():
+        used = sorted({chunk["entity"] for utterance in intent.get("utterances", [])
+                       for chunk in utterance["data"] if "entity" in chunk})
+        intent_hashes[name] = _digest({
+            "intent": intent,
+            "entities": {e: entity_hashes.get(e) for e in used},
+            "language": dataset.get("language"),
+        })
+    return {
+        # Fillers fitted with per-intent seeds differ from unseeded ones
+        "config": _digest(_config_key(config) if seed is None else [_config_key(config), seed]),
+        "snips_version": snips_version(),
+        "entities": entity_hashes,
+        "intents": intent_hashes,
+    }
+
+
+def diff_manifests(previous, current):
+    """Returns the intents whose slot fillers can be reused, plus a change summary."""
+    if (previous is None or previous["config"] != current["config"]
+            or previous["snips_version"] != current["snips_version"]):
+        return set(), {"reason": "no compatible previous fit"}
+
+    old_intents, new_intents = previous["intents"], current["intents"]
+    reusable = {name for name, h in new_intents.items() if old_intents.get(name) == h}
+    old_entities, new_entities = previous["entities"], current["entities"]
+    changes = {
+        "intents_added": sorted(set(new_intents) - set(old_intents)),
+        "intents_removed": sorted(set(old_intents) - set(new_intents)),
+        "intents_changed": sorted(n for n in new_intents
+                                  if n in old_intents and old_intents[n] != new_intents[n]),
+        "entities_changed": sorted(n for n in set(old_entities) | set(new_entities)
+                                   if old_entities.get(n) != new_entities.get(n)),
+    }
+    return reusable, changes
+
+
+# --- 2. TRAINING ---
+def _fit(dataset, config):
+    """Trains a fresh engine on an already-parsed dataset."""
+    from snips_nlu import SnipsNLUEngine
+
+    # Suppress the DeprecationWarning for a cleaner output
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=DeprecationWarning)
+        return SnipsNLUEngine(config=_resolve_config(config)).fit(dataset)
+
+
+def _fit_assembled(dataset, config, reused_slot_fillers, seed=None, workers=1):
+    """Fits an engine around slot fillers that are reused or fitted separately.
+
+    The entity parsers, the lookup parser and the intent classifier are always
+    rebuilt. The per-intent CRF slot fillers in reused_slot_fillers are kept; with
+    a seed, the other intents' fillers are fitted by fit_slot_fillers (in parallel
+    when workers > 1), otherwise engine.fit trains them the usual way.
+    """
+    from snips_nlu import SnipsNLUEngine
+    from snips_nlu.dataset import validate_and_format_dataset
+    from snips_nlu.intent_parser import IntentParser
+    from parallel_training import fit_slot_fillers
+
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=DeprecationWarning)
+        dataset = validate_and_format_dataset(dataset)
+        engine = SnipsNLUEngine(config=_resolve_config(config), random_state=seed)
+        engine.load_resources_if_needed(dataset["language"])
+        engine.fit_builtin_entity_parser_if_needed(dataset)
+        engine.fit_custom_entity_parser_if_needed(dataset)
+        shared = {
+            "builtin_entity_parser": engine.builtin_entity_parser,
+            "custom_entity_parser": engine.custom_entity_parser,
+            "resources": engine.resources,
+            "random_state": engine.random_state,
+        }
+
+        parser_config = next(c for c in engine.config.intent_parsers_configs
+                             if c.unit_name == PROBABILISTIC_PARSER)
+        probabilistic_parser = IntentParser.from_config(parser_config, **shared)
+        for slot_filler in reused_slot_fillers.values():
+            # Point the reused fillers (and their feature factories) at the new shared parsers
+            for unit in [slot_filler] + list(slot_filler.features_factories):
+                unit.builtin_entity_parser = engine.builtin_entity_parser
+                unit.custom_entity_parser = engine.custom_entity_parser
+                unit.resources = engine.resources
+        slot_fillers = dict(reused_slot_fillers)
+        if seed is not None:
+            missing = set(dataset["intents"]) - set(slot_fillers)
+            shared_parsers = {key: value for key, value in shared.items() if key != "random_state"}
+            slot_fillers.update(fit_slot_fillers(dataset, missing, parser_config.slot_filler_config,
+                                                 shared_parsers, seed, workers))
+        probabilistic_parser.slot_fillers = slot_fillers
+
+        # SnipsNLUEngine.fit recycles a pre-seeded parser with the same unit name;
+        # force_retrain=False keeps the fitted slot fillers and fits everything else.
+        engine.intent_parsers = [probabilistic_parser]
+        return engine.fit(dataset, force_retrain=False)
+
+
+def _previous_fit(cache_dir):
+    """Returns (engine_dir, manifest) of the latest fit in cache_dir, or (None, None)."""
+    try:
+        with open(os.path.join(cache_dir, LATEST_FILE), encoding="utf8") as f:
+            engine_dir = os.path.join(cache_dir, f.read().strip())
+        with open(os.path.join(engine_dir, MANIFEST_FILE), encoding="utf8") as f:
+            return engine_dir, json.load(f)
+    except (OSError, ValueError):
+        return None, None
+
+
+def _train(dataset, config, cache_dir, manifest, incremental, seed=None, workers=1):
+    """Trains the engine, incrementally when a compatible previous fit exists.
+
+    Returns (engine, report) where report lists what was reused and rebuilt.
+    """
+    start = time.perf_counter()
+    reusable, changes = set(), {"reason": "incremental training disabled"}
+    if incremental:
+        previous_dir, previous_manifest = _previous_fit(cache_dir)
+        reusable, changes = diff_manifests(previous_manifest, manifest)
+
+    reused = {}
+    if reusable:
+        try:
+            previous = load_engine(previous_dir)
+            parser = next(p for p in previous.intent_parsers if p.unit_name == PROBABILISTIC_PARSER)
+            reused = {name: parser.slot_fillers[name] for name in reusable
+                      if name in parser.slot_fillers}
+        except Exception as e:
+            changes = {"reason": f"previous fit unusable ({e})"}
+
+    if reused:
+        print(f"Starting incremental NLU Engine training (reusing {len(reused)} slot filler(s))...")
+        engine = _fit_assembled(dataset, config, reused, seed, workers)
+    elif seed is not None:
+        print(f"Starting NLU Engine training (seed {seed}, {workers or os.cpu_count()} worker(s))...")
+        engine = _fit_assembled(dataset, config, {}, seed, workers)
+    else:
+        print("Starting NLU Engine training...")
+        engine = _fit(dataset, config)
+
+    report = dict(changes)
+    report["slot_fillers_reused"] = sorted(reused)
+    report["slot_fillers_retrained"] = sorted(set(manifest["intents"]) - set(reused))
+    report["intent_classifier"] = "retrained"
+    report["seed"] = seed
+    report["workers"] = workers if seed is not None else 1
+    report["seconds"] = time.perf_counter() - start
+    return engine, report
+
+
+def format_training_report(report):
+    """Renders a training report as a few human-readable lines."""
+    lines = [f"Training report ({report['seconds']:.2f}s):"]
+    if "reason" in report:
+        lines.append(f"  full retrain: {report['reason']}")
+    for key in ("intents_added", "intents_removed", "intents_changed", "entities_changed"):
+        if report.get(key):
+            lines.append(f"  {key.replace('_', ' ')}: {', '.join(report[key])}")
+    lines.append(f"  slot fillers reused ({len(report['slot_fillers_reused'])}): "
+                 f"{', '.join(report['slot_fillers_reused']) or '-'}")
+    lines.append(f"  slot fillers retrained ({len(report['slot_fillers_retrained'])}): "
+                 f"{', '.join(report['slot_fillers_retrained']) or '-'}")
+    lines.append(f"  intent classifier: {report['intent_classifier']}")
+    if report.get("seed") is not None:
+        lines.append(f"  seed: {report['seed']}, slot filler workers: {report['workers']}")
+    return "\n".join(lines)
+
+
+# --- 3. LOAD OR TRAIN ---
+def load_engine(engine_dir):
+    """Loads a persisted engine directory (imports snips_nlu on first use).
+
+    Directories in the memory-mapped format (mmap_weights.py) are recognised
+    by their manifest and loaded with their arrays mapped.
+    """
+    from mmap_weights import is_mmap_engine, load_mmap_engine
+    if is_mmap_engine(engine_dir):
+        return load_mmap_engine(engine_dir)
+    from snips_nlu import SnipsNLUEngine
+    return SnipsNLUEngine.from_path(engine_dir)
+
+
+def _write_dataset_copy(engine_dir, dataset_bytes):
+    # Written next to the engine so the exact-match trie can be rebuilt from the same data
+    tmp_path = os.path.join(engine_dir, f"{DATASET_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(dataset_bytes)
+    os.replace(tmp_path, os.path.join(engine_dir, DATASET_FILE))
+
+
+def _persist_atomically(engine, target_dir, cache_dir, manifest, dataset_bytes):
+    """Persists the engine and its training dataset to a temp dir, then renames it into place.
+
+    Readers never see a half-written engine. If another worker already
+    published the same fingerprint, our copy is simply discarded.
+    """
+    staging_root = tempfile.mkdtemp(prefix="staging-", dir=cache_dir)
+    try:
+        staging_dir = os.path.join(staging_root, "engine")
+        engine.persist(staging_dir)
+        with open(os.path.join(staging_dir, MANIFEST_FILE), "w", encoding="utf8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        _write_dataset_copy(staging_dir, dataset_bytes)
+        try:
+            os.rename(staging_dir, target_dir)
+        except OSError:
+            if not os.path.isdir(target_dir):
+                raise
+    finally:
+        shutil.rmtree(staging_root, ignore_errors=True)
+
+    # Remember this fit as the base for the next incremental training
+    latest_tmp = os.path.join(cache_dir, f"{LATEST_FILE}.{os.getpid()}.tmp")
+    with open(latest_tmp, "w", encoding="utf8") as f:
+        f.write(os.path.basename(target_dir))
+    os.replace(latest_tmp, os.path.join(cache_dir, LATEST_FILE))
+
+
+def load_or_train_engine(dataset_path="dataset.json", cache_dir=CACHE_DIR,
+                         config=None, incremental=True, seed=None, workers=1):
+    """Loads the engine for dataset_path from the cache, training it on a miss.
+
+    Returns (engine, info) where info holds the fingerprint, the path taken
+    ("cache", "trained" or "incremental"), the engine directory (which also
+    holds the training dataset as DATASET_FILE), the elapsed seconds and,
+    after a training, a report of the slot fillers that were reused or rebuilt.
+    A seed makes training reproducible and lets the slot fillers be fitted
+    by `workers` processes; the worker count does not change the model.
+    config=None means snips' default English config.
+    """
+    start = time.perf_counter()
+    with open(dataset_path, "rb") as f:
+        dataset_bytes = f.read()
+
+    fingerprint = engine_fingerprint(dataset_bytes, config, seed)
+    engine_dir = os.path.join(cache_dir, fingerprint)
+
+    if os.path.isdir(engine_dir):
+        try:
+            engine = load_engine(engine_dir)
+            if not os.path.exists(os.path.join(engine_dir, DATASET_FILE)):
+                # Entries cached before the dataset copy existed; the fingerprint vouches for the bytes
+                _write_dataset_copy(engine_dir, dataset_bytes)
+            info = {"fingerprint": fingerprint, "source": "cache",
+                    "path": engine_dir, "seconds": time.perf_counter() - start}
+            return engine, info
+        except Exception as e:
+            # A corrupt or incompatible entry is dropped and rebuilt
+            print(f"Cached engine {fingerprint} could not be loaded ({e}); retraining.")
+            shutil.rmtree(engine_dir, ignore_errors=True)
+
+    dataset = json.loads(dataset_bytes.decode("utf8"))
+    manifest = training_manifest(dataset, config, seed)
+    os.makedirs(cache_dir, exist_ok=True)
+    engine, report = _train(dataset, config, cache_dir, manifest, incremental, seed, workers)
+
+    _persist_atomically(engine, engine_dir, cache_dir, manifest, dataset_bytes)
+    info = {"fingerprint": fingerprint,
+            "source": "incremental" if report["slot_fillers_reused"] else "trained",
+            "path": engine_dir, "seconds": time.perf_counter() - start,
+            "report": report}
+    return engine, info
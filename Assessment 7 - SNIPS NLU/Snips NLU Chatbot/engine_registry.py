@@ -0,0 +1,147 @@
+# ====================================================================
+# engine_registry.py: Per-tenant engines, loaded lazily, LRU-evicted
+# Every tenant (customer bot) has its own persisted engine directory.
+# An engine is loaded on the tenant's first request and kept resident
+# until the registry exceeds max_engines or max_bytes; then the least
+# recently used tenants are dropped and reloaded on their next request.
+# ====================================================================
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def directory_size(path):
+    """Total size in bytes of the files under path.
+
+    Used as the memory cost of a resident engine: a loaded Snips engine is
+    roughly proportional to its persisted resources and models.
+    """
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            total += os.path.getsize(os.path.join(dirpath, name))
+    return total
+
+
+class _Resident:
+    __slots__ = ("model", "size")
+
+    def __init__(self, model, size):
+        self.model = model
+        self.size = size
+
+
+class EngineRegistry:
+    """Thread-safe tenant id -> engine map with lazy loading and LRU residency.
+
+    loader(engine_dir) builds whatever is kept per tenant (an engine, or an
+    engine plus its caches). At most max_engines models, and if max_bytes is
+    set at most that many bytes (as measured by sizer), stay resident; the most
+    recently loaded model is always kept, even when it alone exceeds max_bytes.
+    Loads run outside the registry lock, so a slow load never blocks other tenants.
+    """
+
+    def __init__(self, engine_dirs, loader, max_engines=8, max_bytes=None,
+                 sizer=directory_size):
+        self.engine_dirs = dict(engine_dirs)
+        self.max_engines = max_engines
+        self.max_bytes = max_bytes
+        self._loader = loader
+        self._sizer = sizer
+        self._lock = threading.Lock()
+        self._resident = OrderedDict()  # tenant_id -> _Resident, least recently used first
+        self._loading = {}  # tenant_id -> lock held while that tenant is being loaded
+        self.resident_bytes = 0
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    @classmethod
+    def from_file(cls, path, loader, **kwargs):
+        """Reads {tenant_id: engine_dir} from a JSON file; relative dirs are resolved against it."""
+        with open(path, encoding="utf8") as f:
+            mapping = json.load(f)
+        base = os.path.dirname(os.path.abspath(path))
+        return cls({tenant: os.path.join(base, engine_dir) for tenant, engine_dir in mapping.items()},
+                   loader, **kwargs)
+
+    def __contains__(self, tenant_id):
+        return tenant_id in self.engine_dirs
+
+    def __len__(self):
+        return len(self._resident)
+
+    def _lookup(self, tenant_id):
+        # Caller holds self._lock
+        resident = self._resident.get(tenant_id)
+        if resident is not None:
+            self._resident.move_to_end(tenant_id)
+            self.hits += 1
+            return resident.model
+        return None
+
+    def get(self, tenant_id):
+        """Returns the tenant's model, loading it on first use. Raises KeyError if unknown."""
+        with self._lock:
+            model = self._lookup(tenant_id)
+            if model is not None:
+                return model
+            if tenant_id not in self.engine_dirs:
+                raise KeyError(f"unknown tenant {tenant_id!r}")
+            load_lock = self._loading.setdefault(tenant_id, threading.Lock())
+
+        # Concurrent first requests for one tenant wait here and share a single load
+        with load_lock:
+            with self._lock:
+                model = self._lookup(tenant_id)
+                if model is not None:
+                    return model
+                engine_dir = self.engine_dirs[tenant_id]
+
+            start = time.perf_counter()
+            model = self._loader(engine_dir)
+            size = self._sizer(engine_dir)
+
+            with self._lock:
+                self._resident[tenant_id] = _Resident(model, size)
+                self.resident_bytes += size
+                self.loads += 1
+                self.load_seconds += time.perf_counter() - start
+                self._loading.pop(tenant_id, None)
+                self._evict_over_budget()
+            return model
+
+    def _evict_over_budget(self):
+        # Caller holds self._lock; the newest entry (last) is never evicted
+        while len(self._resident) > 1 and (
+                len(self._resident) > self.max_engines
+                or (self.max_bytes is not None and self.resident_bytes > self.max_bytes)):
+            _, resident = self._resident.popitem(last=False)
+            self.resident_bytes -= resident.size
+            self.evictions += 1
+
+    def evict(self, tenant_id):
+        """Drops a tenant's model (e.g. after its engine was retrained); returns True if it was resident."""
+        with self._lock:
+            resident = self._resident.pop(tenant_id, None)
+            if resident is None:
+                return False
+            self.resident_bytes -= resident.size
+            self.evictions += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tenants": len(self.engine_dirs),
+                "resident_engines": len(self._resident),
+                "resident_mb": round(self.resident_bytes / (1 << 20), 2),
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "avg_load_seconds": self.load_seconds / self.loads if self.loads else None,
+            }
@@ -0,0 +1,189 @@
+# ====================================================================
+# exact_matcher.py: Trie fast path in front of the Snips engine
+# Training utterances from dataset.json are compiled into a token trie
+# whose slot positions point at per-entity tries of values/synonyms.
+# An input that walks the trie end to end gets a Snips-shaped parsing
+# result without calling engine.parse; everything else falls through.
+# Matching ignores case and punctuation ("Lights ON!" == "lights on").
+# ====================================================================
+
+import io
+import json
+import re
+import threading
+import time
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Returns [(token, start, end)] with casefolded tokens and spans into text."""
+    return [(m.group().casefold(), m.start(), m.end()) for m in TOKEN_RE.finditer(text)]
+
+
+class _Node:
+    __slots__ = ("children", "slot_edges", "value")
+
+    def __init__(self):
+        self.children = {}     # token -> _Node
+        self.slot_edges = {}   # (slot_name, entity) -> _Node (utterance trie only)
+        self.value = None      # intent name / resolved entity value at a terminal
+
+
+_AMBIGUOUS = object()
+
+
+def _insert(root, tokens, value):
+    node = root
+    for token in tokens:
+        node = node.children.setdefault(token, _Node())
+    # Two intents (or two entity values) sharing a path cannot be decided here
+    if node.value is not None and node.value != value:
+        node.value = _AMBIGUOUS
+    else:
+        node.value = value
+    return node
+
+
+class ExactMatcher:
+    """Resolves verbatim training utterances and entity synonyms without the ML engine."""
+
+    def __init__(self, dataset):
+        self._entity_tries = {}
+        self._root = _Node()
+        self._build_entities(dataset.get("entities", {}))
+        self._build_utterances(dataset.get("intents", {}))
+        self._lock = threading.Lock()  # the HTTP server parses on several threads
+        self.hits = 0
+        self.misses = 0
+        self.match_seconds = 0.0
+        self.fallback_seconds = 0.0
+
+    @classmethod
+    def from_file(cls, dataset_path="dataset.json"):
+        with io.open(dataset_path, encoding="utf8") as f:
+            return cls(json.load(f))
+
+    # --- 1. COMPILATION ---
+    def _build_entities(self, entities):
+        for entity_name, entity in entities.items():
+            if "data" not in entity:
+                continue  # builtin entity: values are not enumerable
+            root = _Node()
+            for entry in entity["data"]:
+                value = entry["value"]
+                names = [value]
+                if entity.get("use_synonyms", True):
+                    names.extend(entry.get("synonyms", []))
+                for name in names:
+                    tokens = [t for t, _, _ in tokenize(name)]
+                    if tokens:
+                        _insert(root, tokens, value)
+            self._entity_tries[entity_name] = root
+
+    def _build_utterances(self, intents):
+        for intent_name, intent in intents.items():
+            for utterance in intent.get("utterances", []):
+                node = self._root
+                for chunk in utterance["data"]:
+                    entity = chunk.get("entity")
+                    if entity is None:
+                        for token, _, _ in tokenize(chunk["text"]):
+                            node = node.children.setdefault(token, _Node())
+                        continue
+                    if entity not in self._entity_tries:
+                        break  # builtin slot: leave this utterance to the engine
+                    node = node.slot_edges.setdefault((chunk["slot_name"], entity), _Node())
+                else:
+                    if node is not self._root:
+                        if node.value is not None and node.value != intent_name:
+                            node.value = _AMBIGUOUS
+                        else:
+                            node.value = intent_name
+
+    # --- 2. MATCHING ---
+    def _walk(self, node, tokens, i, slots):
+        if i == len(tokens):
+            if node.value is None or node.value is _AMBIGUOUS:
+                return None
+            return node.value, list(slots)
+
+        child = node.children.get(tokens[i][0])
+        if child is not None:
+            found = self._walk(child, tokens, i + 1, slots)
+            if found is not None:
+                return found
+
+        for (slot_name, entity), child in node.slot_edges.items():
+            entity_node = self._entity_tries[entity]
+            j = i
+            while j < len(tokens):
+                entity_node = entity_node.children.get(tokens[j][0])
+                if entity_node is None:
+                    break
+                j += 1
+                if entity_node.value is not None and entity_node.value is not _AMBIGUOUS:
+                    slots.append((slot_name, entity, entity_node.value, tokens[i][1], tokens[j - 1][2]))
+                    found = self._walk(child, tokens, j, slots)
+                    slots.pop()
+                    if found is not None:
+                        return found
+        return None
+
+    def match(self, text):
+        """Returns a Snips-shaped parsing result for an exact hit, else None."""
+        tokens = tokenize(text)
+        if not tokens:
+            return None
+        found = self._walk(self._root, tokens, 0, [])
+        if found is None:
+            return None
+        intent_name, slots = found
+        return {
+            "input": text,
+            "intent": {"intentName": intent_name, "probability": 1.0},
+            "slots": [
+                {
+                    "range": {"start": start, "end": end},
+                    "rawValue": text[start:end],
+                    "value": {"kind": "Custom", "value": value},
+                    "entity": entity,
+                    "slotName": slot_name,
+                }
+                for slot_name, entity, value, start, end in slots
+            ],
+        }
+
+    def parse(self, text, fallback):
+        """Answers from the trie when possible, otherwise calls fallback(text)."""
+        start = time.perf_counter()
+        result = self.match(text)
+        matched = time.perf_counter()
+        if result is not None:
+            with self._lock:
+                self.match_seconds += matched - start
+                self.hits += 1
+            return result
+        result = fallback(text)
+        with self._lock:
+            self.match_seconds += matched - start
+            self.misses += 1
+            self.fallback_seconds += time.perf_counter() - matched
+        return result
+
+    def stats(self):
+        """Hit rate, mean match cost, and the fallback time the hits avoided (estimated)."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            match_seconds, fallback_seconds = self.match_seconds, self.fallback_seconds
+        lookups = hits + misses
+        avg_fallback = fallback_seconds / misses if misses else 0.0
+        avg_match = match_seconds / lookups if lookups else 0.0
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "avg_match_us": avg_match * 1e6,
+            "avg_fallback_ms": avg_fallback * 1e3,
+            "est_saved_seconds": max(0.0, hits * (avg_fallback - avg_match)),
+        }
@@ -0,0 +1,143 @@
+# ====================================================================
+# hot_reload.py: Live model holder + background dataset.json watcher
+# The live model (engine + exact-match trie + fingerprint) is one
+# immutable snapshot; a swap is a single attribute assignment. A turn
+# grabs the snapshot once, so in-flight parses finish on the old engine
+# while new turns see the new one - nothing is dropped or blocked.
+# ====================================================================
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from engine_cache import (
+    CACHE_DIR, DATASET_FILE, engine_fingerprint, format_training_report, load_engine,
+    load_or_train_engine)
+from exact_matcher import ExactMatcher
+
+ModelSnapshot = namedtuple("ModelSnapshot", "engine matcher fingerprint loaded_at")
+
+
+# --- 1. LIVE MODEL ---
+class ModelHolder:
+    """Holds the live ModelSnapshot; readers never lock, writers swap atomically."""
+
+    def __init__(self):
+        self.current = None
+        self.swaps = 0
+        self.last_error = None
+
+    def swap(self, engine, matcher, fingerprint):
+        self.current = ModelSnapshot(engine, matcher, fingerprint, time.time())
+        self.swaps += 1
+
+    def status(self):
+        """Monitoring view: current fingerprint, last swap time and reload errors."""
+        current = self.current
+        return {
+            "model_fingerprint": current.fingerprint if current else None,
+            "last_swap_time": (datetime.fromtimestamp(current.loaded_at, timezone.utc).isoformat()
+                               if current else None),
+            "swaps": self.swaps,
+            "last_reload_error": self.last_error,
+        }
+
+
+# --- 2. BACKGROUND RETRAINING ---
+def _warm_cache(dataset_path, cache_dir, seed, train_workers, conn):
+    """Runs in a child process: trains (if needed), persists into the model cache
+    and sends back the (fingerprint, engine directory) it produced."""
+    _, info = load_or_train_engine(dataset_path, cache_dir, seed=seed, workers=train_workers)
+    if "report" in info:
+        print(format_training_report(info["report"]))
+    conn.send((info["fingerprint"], info["path"]))
+    conn.close()
+
+
+class DatasetWatcher(threading.Thread):
+    """Polls dataset.json and hot-swaps a retrained model into the holder.
+
+    Training runs in a separate process so it does not compete with serving
+    threads for the GIL; the trained engine is handed over through the model
+    cache and loaded here from the exact directory the trainer reports.
+    """
+
+    def __init__(self, holder, dataset_path="dataset.json", cache_dir=CACHE_DIR,
+                 poll_seconds=2.0, seed=None, train_workers=1):
+        super().__init__(name="dataset-watcher", daemon=True)
+        self.holder = holder
+        self.dataset_path = dataset_path
+        self.cache_dir = cache_dir
+        self.poll_seconds = poll_seconds
+        self.seed = seed
+        self.train_workers = train_workers
+        self._stop_event = threading.Event()
+        # Baseline taken now, so an edit made right after start() is not missed
+        self._last_seen = self._stat()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.dataset_path)
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def run(self):
+        while not self._stop_event.wait(self.poll_seconds):
+            changed = self._stat()
+            if changed is None or changed == self._last_seen:
+                continue
+            # Wait one more interval so a file still being written is not picked up half-way
+            if self._stop_event.wait(self.poll_seconds) or self._stat() != changed:
+                continue
+            self._last_seen = changed
+            self.reload()
+
+    def reload(self):
+        """Retrains for the current dataset and swaps it in; returns True if swapped."""
+        start = time.perf_counter()
+        try:
+            with open(self.dataset_path, "rb") as f:
+                fingerprint = engine_fingerprint(f.read(), seed=self.seed)
+            current = self.holder.current
+            if current is not None and current.fingerprint == fingerprint:
+                return False
+
+            print(f"[hot-reload] dataset.json changed; training model {fingerprint} in the background...")
+            # spawn (not fork): the serving process is multi-threaded. Not a daemon, so
+            # it may start its own slot-filler pool (--train-workers); it is joined below.
+            context = multiprocessing.get_context("spawn")
+            receiver, sender = context.Pipe(duplex=False)
+            trainer = context.Process(
+                target=_warm_cache,
+                args=(self.dataset_path, self.cache_dir, self.seed, self.train_workers, sender))
+            trainer.start()
+            sender.close()
+            trainer.join()
+            if trainer.exitcode != 0:
+                raise RuntimeError(f"training process exited with code {trainer.exitcode}")
+
+            # Load what the trainer persisted rather than re-resolving the dataset here:
+            # the file may have changed meanwhile, and a miss would train in this process.
+            # The trie is built from the dataset copy stored with that engine, not from
+            # dataset.json, so engine and matcher always come from the same data.
+            fingerprint, engine_dir = receiver.recv()
+            receiver.close()
+            engine = load_engine(engine_dir)
+            matcher = ExactMatcher.from_file(os.path.join(engine_dir, DATASET_FILE))
+            self.holder.swap(engine, matcher, fingerprint)
+            self.holder.last_error = None
+            print(f"[hot-reload] swapped in model {fingerprint} "
+                  f"after {time.perf_counter() - start:.2f}s.")
+            return True
+        except Exception as e:
+            # Keep serving the old model; the next change to the file retries
+            self.holder.last_error = f"{type(e).__name__}: {e}"
+            print(f"[hot-reload] reload failed, keeping the current model: {self.holder.last_error}")
+            return False
@@ -0,0 +1,90 @@
+# ====================================================================
+# intent_gate.py: Classify first, fill slots only for confident intents
+# engine.parse always runs the slot filler of the winning intent, even
+# when its probability is so low that the dialogue falls back anyway.
+# The gate calls engine.get_intents() first and only calls
+# engine.get_slots() when the top intent clears the threshold; gated
+# turns go straight to the fallback branch (intentName None).
+# ====================================================================
+
+import threading
+import time
+
+
+class IntentGate:
+    """Drop-in parse(engine, text) with top-k shortlisting and confidence gating.
+
+    Every result carries "intents" (the top_k shortlist with probabilities) and
+    "gate": whether slot filling ran, the classification and slot filling times,
+    and for gated turns the time saved, estimated from the mean slot filling time
+    observed for that intent (or for all intents when it has not been seen yet).
+    """
+
+    def __init__(self, threshold=0.5, top_k=3, clock=time.perf_counter):
+        self.threshold = threshold
+        self.top_k = top_k
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._slot_seconds = {}  # intent -> [count, total seconds] of get_slots calls
+        self._all_slots = [0, 0.0]
+        self.requests = 0
+        self.gated = 0
+        self.saved_seconds = 0.0
+
+    def _expected_slot_seconds(self, intent_name):
+        # Caller holds the lock
+        count, total = self._slot_seconds.get(intent_name) or self._all_slots
+        return total / count if count else 0.0
+
+    def parse(self, engine, text):
+        clock = self._clock
+        t0 = clock()
+        intents = engine.get_intents(text)
+        t1 = clock()
+        top = intents[0]
+        intent_name = top["intentName"]
+        passed = intent_name is not None and top["probability"] >= self.threshold
+
+        if passed:
+            slots = engine.get_slots(text, intent_name)
+            slot_seconds = clock() - t1
+            saved = 0.0
+        else:
+            slots = []
+            slot_seconds = 0.0
+
+        with self._lock:
+            self.requests += 1
+            if passed:
+                stats = self._slot_seconds.setdefault(intent_name, [0, 0.0])
+                stats[0] += 1
+                stats[1] += slot_seconds
+                self._all_slots[0] += 1
+                self._all_slots[1] += slot_seconds
+            else:
+                self.gated += 1
+                saved = self._expected_slot_seconds(intent_name) if intent_name is not None else 0.0
+                self.saved_seconds += saved
+
+        return {
+            "input": text,
+            "intent": top if passed else {"intentName": None, "probability": top["probability"]},
+            "slots": slots,
+            "intents": intents[:self.top_k],
+            "gate": {
+                "passed": passed,
+                "classify_ms": (t1 - t0) * 1e3,
+                "slots_ms": slot_seconds * 1e3,
+                "saved_ms": saved * 1e3,
+            },
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "requests": self.requests,
+                "gated": self.gated,
+                "gated_rate": self.gated / self.requests if self.requests else 0.0,
+                "saved_seconds": self.saved_seconds,
+            }
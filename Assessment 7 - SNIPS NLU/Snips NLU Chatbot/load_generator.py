@@ -0,0 +1,321 @@
+# ====================================================================
+# load_generator.py: Synthetic load and replay harness for the chatbot
+# Expands the utterance templates of dataset.json / my_dataset.yaml with
+# every entity value and synonym into an endless stream of utterances,
+# then drives the in-process pipeline or a running `--serve` endpoint:
+#   closed loop: N clients, each sends its next turn when the last returns
+#   fixed QPS:   turns are scheduled at a constant rate (open loop);
+#                latency counts from the scheduled time, so queueing shows
+# The report (throughput, p50/p95/p99, error rate) is printed as JSON.
+# Run: python load_generator.py --target inproc --clients 8 --duration 30
+#      python load_generator.py --target http://127.0.0.1:8080 --qps 200
+# ====================================================================
+
+import argparse
+import contextlib
+import http.client
+import json
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# "[room](kitchen)" in the YAML dataset format
+YAML_SLOT = re.compile(r"\[(?P<slot>[^\]]+)\]\((?P<text>[^)]*)\)")
+
+
+# --- 1. TEMPLATES ---
+def load_json_templates(path):
+    """Returns (templates, entities) from a Snips JSON dataset.
+
+    A template is (intent, [(text, None) | (example, (slot, entity))]) and
+    entities maps an entity name to every value and synonym it accepts.
+    """
+    with open(path, encoding="utf8") as f:
+        dataset = json.load(f)
+    templates = []
+    for intent_name, intent in dataset.get("intents", {}).items():
+        for utterance in intent.get("utterances", []):
+            chunks = [(c["text"], (c["slot_name"], c["entity"]) if "entity" in c else None)
+                      for c in utterance["data"]]
+            templates.append((intent_name, chunks))
+    entities = {}
+    for name, entity in dataset.get("entities", {}).items():
+        values = entities.setdefault(name, [])
+        for entry in entity.get("data", []):
+            values.append(entry["value"])
+            values.extend(entry.get("synonyms", []))
+    return templates, entities
+
+
+def load_yaml_templates(path):
+    """Same as load_json_templates for the YAML format of `snips-nlu generate-dataset`."""
+    import yaml  # Only needed for YAML input
+
+    templates, entities = [], {}
+    with open(path, encoding="utf8") as f:
+        documents = [doc for doc in yaml.safe_load_all(f) if doc]
+    for doc in documents:
+        if doc.get("type") == "entity":
+            values = entities.setdefault(doc["name"], [])
+            for entry in doc.get("values", []):
+                values.extend(entry if isinstance(entry, list) else [entry])
+    for doc in documents:
+        if doc.get("type") != "intent":
+            continue
+        slot_entities = {slot["name"]: slot["entity"] for slot in doc.get("slots", [])}
+        for utterance in doc.get("utterances", []):
+            chunks, position = [], 0
+            for match in YAML_SLOT.finditer(utterance):
+                if match.start() > position:
+                    chunks.append((utterance[position:match.start()], None))
+                slot = match.group("slot")
+                chunks.append((match.group("text"), (slot, slot_entities.get(slot))))
+                position = match.end()
+            if position < len(utterance):
+                chunks.append((utterance[position:], None))
+            templates.append((doc["name"], chunks))
+    return templates, entities
+
+
+def merge_sources(sources):
+    """Merges (templates, entities) pairs, dropping duplicate templates and values."""
+    templates, seen, entities = [], set(), {}
+    for source_templates, source_entities in sources:
+        for intent_name, chunks in source_templates:
+            key = (intent_name, tuple(chunks))
+            if key not in seen:
+                seen.add(key)
+                templates.append((intent_name, chunks))
+        for name, values in source_entities.items():
+            merged = entities.setdefault(name, [])
+            merged.extend(v for v in values if v not in merged)
+    return templates, entities
+
+
+class UtteranceStream:
+    """Endless stream of (expected intent, utterance) built from the templates.
+
+    Slots are filled with a random value or synonym of their entity (the
+    template's own example for builtin or unknown entities), and the casing of
+    the whole utterance varies like real typed input.
+    """
+
+    def __init__(self, templates, entities, seed=None):
+        if not templates:
+            raise ValueError("no utterance templates found")
+        self.templates = templates
+        self.entities = entities
+        self._rng = random.Random(seed)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        rng = self._rng
+        intent_name, chunks = rng.choice(self.templates)
+        parts = []
+        for text, slot in chunks:
+            values = self.entities.get(slot[1]) if slot else None
+            parts.append(rng.choice(values).replace("_", " ") if values else text)
+        utterance = "".join(parts)
+        casing = rng.random()
+        if casing < 0.15:
+            utterance = utterance.lower()
+        elif casing < 0.25:
+            utterance = utterance.capitalize()
+        return intent_name, utterance
+
+
+# --- 2. TARGETS ---
+class InProcessTarget:
+    """Runs the turn through chatbot_app's pipeline (parse + get_bot_response)."""
+
+    def __init__(self):
+        import chatbot_app
+        # Training messages go to stderr; stdout carries the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            engine = chatbot_app.train_engine()
+        if engine is None:
+            raise RuntimeError("could not load or train the NLU engine")
+        self._handle = chatbot_app.handle_message
+
+    def __call__(self, text, session_id):
+        return self._handle(text, session_id)
+
+
+class HttpTarget:
+    """POSTs the turn to a running `chatbot_app.py --serve`, one keep-alive connection per thread."""
+
+    def __init__(self, url, timeout=10.0):
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.path = parsed.path if parsed.path not in ("", "/") else "/chat"
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __call__(self, text, session_id):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        body = json.dumps({"session_id": session_id, "text": text})
+        try:
+            conn.request("POST", self.path, body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next turn
+            conn.close()
+            self._local.conn = None
+            raise
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+        return json.loads(payload)
+
+
+# --- 3. LOAD MODES ---
+class _Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = {}
+        self.mismatches = 0
+
+    def record(self, latency, expected_intent, turn=None, error=None):
+        with self.lock:
+            if error is not None:
+                key = type(error).__name__ if not isinstance(error, RuntimeError) else str(error)
+                self.errors[key] = self.errors.get(key, 0) + 1
+                return
+            self.latencies.append(latency)
+            if turn.get("intent") != expected_intent:
+                self.mismatches += 1
+
+
+def _one_turn(target, results, expected_intent, text, session_id, started):
+    try:
+        turn = target(text, session_id)
+    except Exception as e:
+        results.record(None, expected_intent, error=e)
+        return
+    results.record(time.perf_counter() - started, expected_intent, turn)
+
+
+def run_closed_loop(target, streams, duration):
+    """N clients (one stream each) send turns back to back for `duration` seconds."""
+    results = _Results()
+    deadline = time.perf_counter() + duration
+
+    def client(index, stream):
+        session_id = f"load-{index}"
+        for expected_intent, text in stream:
+            started = time.perf_counter()
+            if started >= deadline:
+                return
+            _one_turn(target, results, expected_intent, text, session_id, started)
+
+    threads = [threading.Thread(target=client, args=(i, s)) for i, s in enumerate(streams)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - start
+
+
+def run_fixed_rate(target, stream, qps, duration, workers, sessions=64):
+    """Schedules turns at a constant rate; a slow target builds a backlog, not a lower rate."""
+    results = _Results()
+    interval = 1.0 / qps
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="load") as pool:
+        for n, (expected_intent, text) in enumerate(stream):
+            scheduled = start + n * interval
+            if scheduled - start >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(_one_turn, target, results, expected_intent, text,
+                        f"load-{n % sessions}", scheduled)
+    return results, time.perf_counter() - start
+
+
+def build_report(results, elapsed, settings):
+    latencies = sorted(results.latencies)
+    ok = len(latencies)
+    failed = sum(results.errors.values())
+    total = ok + failed
+
+    def percentile(q):
+        return latencies[min(ok - 1, int(q * ok))] * 1e3 if ok else None
+
+    return {
+        "settings": settings,
+        "elapsed_seconds": elapsed,
+        "requests": total,
+        "succeeded": ok,
+        "errors": failed,
+        "error_rate": failed / total if total else 0.0,
+        "error_kinds": results.errors,
+        "throughput_rps": ok / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / ok * 1e3 if ok else None,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": latencies[-1] * 1e3 if ok else None,
+        },
+        # Share of answered turns whose intent differs from the template's intent
+        "intent_mismatch_rate": results.mismatches / ok if ok else 0.0,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Synthetic load generator for the chatbot")
+    parser.add_argument("--target", default="inproc",
+                        help="'inproc' (chatbot_app pipeline) or the URL of a running --serve")
+    parser.add_argument("--dataset", action="append",
+                        help="dataset.json or *.yaml template source (repeatable; "
+                             "default: dataset.json and my_dataset.yaml)")
+    parser.add_argument("--clients", type=int, default=8,
+                        help="closed-loop clients, or worker threads with --qps")
+    parser.add_argument("--qps", type=float, help="fixed arrival rate (open loop) instead of closed loop")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the utterance streams")
+    parser.add_argument("--out", metavar="FILE", help="also write the JSON report to FILE")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sources = []
+    for path in args.dataset or ["dataset.json", "my_dataset.yaml"]:
+        loader = load_yaml_templates if path.endswith((".yaml", ".yml")) else load_json_templates
+        try:
+            sources.append(loader(path))
+        except (OSError, ImportError) as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+    templates, entities = merge_sources(sources)
+
+    target = InProcessTarget() if args.target == "inproc" else HttpTarget(args.target)
+    settings = {"target": args.target, "templates": len(templates), "duration": args.duration,
+                "mode": "fixed_rate" if args.qps else "closed_loop",
+                "qps": args.qps, "clients": args.clients, "seed": args.seed}
+    print(f"Driving {args.target} for {args.duration:.0f}s ({settings['mode']}, "
+          f"{len(templates)} templates)...", file=sys.stderr)
+    if args.qps:
+        results, elapsed = run_fixed_rate(target, UtteranceStream(templates, entities, args.seed),
+                                          args.qps, args.duration, args.clients)
+    else:
+        streams = [UtteranceStream(templates, entities, args.seed + i) for i in range(args.clients)]
+        results, elapsed = run_closed_loop(target, streams, args.duration)
+
+    report = json.dumps(build_report(results, elapsed, settings), indent=2)
+    print(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf8") as f:
+            f.write(report + "\n")
@@ -0,0 +1,249 @@
+# ====================================================================
+# mmap_weights.py: Engine format with memory-mapped intent weights
+# A persisted engine stores the intent classifier's coefficients and the
+# tf-idf vocabulary as JSON lists and dicts: every process that loads it
+# parses them into private heap memory. The mmap format moves them into
+# flat binary files (.npy arrays, plus a sorted key blob for the
+# vocabulary) that are opened with numpy.memmap. Loading no longer
+# depends on their size, and every process maps the same page-cache
+# pages, so N workers hold one copy instead of N.
+# The CRF slot filler weights are left alone: python-crfsuite reads its
+# own binary model file and offers no mmap hook.
+# ====================================================================
+
+import bisect
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections.abc import Mapping
+
+from engine_cache import DATASET_FILE
+
+MMAP_MANIFEST = "mmap_weights.json"
+ENGINE_FILE = "nlu_engine.json"
+
+
+# --- 1. MEMORY-MAPPED VOCABULARY ---
+class _SortedKeys:
+    """Sequence view of the UTF-8 keys in the blob, for bisect."""
+
+    def __init__(self, blob, offsets):
+        self._blob = memoryview(blob)
+        self._offsets = memoryview(offsets)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+
+class MmapVocabulary(Mapping):
+    """Read-only {ngram: feature index} backed by three memory-mapped arrays.
+
+    keys.npy holds the ngrams sorted by their UTF-8 bytes and concatenated,
+    offsets.npy their boundaries and index.npy their feature indices; a
+    lookup is a binary search. sklearn's vectorizer only needs
+    vocabulary_[ngram] (KeyError when absent) and len().
+    """
+
+    def __init__(self, directory):
+        import numpy as np
+
+        self.directory = directory
+        self._keys = _SortedKeys(np.load(os.path.join(directory, "keys.npy"), mmap_mode="r"),
+                                 np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r"))
+        self._index = memoryview(np.load(os.path.join(directory, "index.npy"), mmap_mode="r"))
+
+    def __getitem__(self, ngram):
+        key = ngram.encode("utf8")
+        i = bisect.bisect_left(self._keys, key)
+        if i == len(self._keys) or self._keys[i] != key:
+            raise KeyError(ngram)
+        return self._index[i]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        for i in range(len(self._keys)):
+            yield self._keys[i].decode("utf8")
+
+
+def write_vocabulary(vocab, directory):
+    """Writes {ngram: index} as the three arrays MmapVocabulary maps."""
+    import numpy as np
+
+    items = sorted((ngram.encode("utf8"), index) for ngram, index in vocab.items())
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    np.cumsum([len(key) for key, _ in items], out=offsets[1:])
+    np.save(os.path.join(directory, "keys.npy"),
+            np.frombuffer(b"".join(key for key, _ in items), dtype=np.uint8))
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+    np.save(os.path.join(directory, "index.npy"), np.array([i for _, i in items], dtype=np.int64))
+
+
+# --- 2. CONVERTING A PERSISTED ENGINE ---
+def _read_json(path):
+    with open(path, encoding="utf8") as f:
+        return json.load(f)
+
+
+def _write_json(path, obj):
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(obj, f, indent=2, sort_keys=True)
+
+
+def _convert_classifier(classifier_dir):
+    """Moves one intent classifier's arrays out of its JSON files; returns the manifest entry."""
+    import numpy as np
+
+    entry = {}
+    model_path = os.path.join(classifier_dir, "intent_classifier.json")
+    model = _read_json(model_path)
+    if model.get("coeffs") is not None:
+        np.save(os.path.join(classifier_dir, "coeffs.npy"), np.asarray(model["coeffs"], dtype=np.float64))
+        np.save(os.path.join(classifier_dir, "intercept.npy"), np.asarray(model["intercept"], dtype=np.float64))
+        entry["t_"] = model["t_"]
+        model["coeffs"] = model["intercept"] = None
+        _write_json(model_path, model)
+
+    if model.get("featurizer"):
+        featurizer_dir = os.path.join(classifier_dir, model["featurizer"])
+        featurizer = _read_json(os.path.join(featurizer_dir, "featurizer.json"))
+        if featurizer.get("tfidf_vectorizer"):
+            vectorizer_dir = os.path.join(featurizer_dir, featurizer["tfidf_vectorizer"])
+            vectorizer_path = os.path.join(vectorizer_dir, "vectorizer.json")
+            vectorizer = _read_json(vectorizer_path)
+            fitted = vectorizer.get("vectorizer")
+            if fitted and fitted["vocab"]:
+                write_vocabulary(fitted["vocab"], vectorizer_dir)
+                np.save(os.path.join(vectorizer_dir, "idf.npy"), np.asarray(fitted["idf_diag"], dtype=np.float64))
+                # Still a fitted vectorizer to snips, with the arrays attached after loading
+                vectorizer["vectorizer"] = {"vocab": {}, "idf_diag": []}
+                _write_json(vectorizer_path, vectorizer)
+                entry["vectorizer"] = vectorizer_dir
+    return entry
+
+
+def convert_engine_dir(engine_dir, out_dir):
+    """Copies a persisted engine to out_dir in the mmap format; returns the manifest."""
+    if os.path.exists(out_dir):
+        raise FileExistsError(f"{out_dir} already exists")
+    shutil.copytree(engine_dir, out_dir)
+    parsers = []
+    for index, parser_name in enumerate(_read_json(os.path.join(out_dir, ENGINE_FILE))["intent_parsers"]):
+        classifier_dir = os.path.join(out_dir, parser_name, "intent_classifier")
+        if not os.path.exists(os.path.join(classifier_dir, "intent_classifier.json")):
+            continue  # e.g. the deterministic parser
+        entry = _convert_classifier(classifier_dir)
+        if entry:
+            entry["index"] = index
+            entry["classifier"] = os.path.relpath(classifier_dir, out_dir)
+            if "vectorizer" in entry:
+                entry["vectorizer"] = os.path.relpath(entry["vectorizer"], out_dir)
+            parsers.append(entry)
+    manifest = {"format": 1, "intent_parsers": parsers}
+    _write_json(os.path.join(out_dir, MMAP_MANIFEST), manifest)
+    return manifest
+
+
+def is_mmap_engine(engine_dir):
+    return os.path.exists(os.path.join(engine_dir, MMAP_MANIFEST))
+
+
+# --- 3. LOADING ---
+def load_mmap_engine(engine_dir):
+    """Loads an engine written by convert_engine_dir and maps its arrays read-only.
+
+    The loaded engine parses like the original and can be persisted again
+    (it then writes the plain JSON format).
+    """
+    import numpy as np
+    import scipy.sparse as sp
+    from sklearn.linear_model import SGDClassifier
+    from snips_nlu import SnipsNLUEngine
+    from snips_nlu.intent_classifier.log_reg_classifier import LOG_REG_ARGS
+
+    engine = SnipsNLUEngine.from_path(engine_dir)
+    for entry in _read_json(os.path.join(engine_dir, MMAP_MANIFEST))["intent_parsers"]:
+        intent_classifier = engine.intent_parsers[entry["index"]].intent_classifier
+        classifier_dir = os.path.join(engine_dir, entry["classifier"])
+        if "t_" in entry:
+            classifier = SGDClassifier(**LOG_REG_ARGS)
+            classifier.coef_ = np.load(os.path.join(classifier_dir, "coeffs.npy"), mmap_mode="r")
+            classifier.intercept_ = np.load(os.path.join(classifier_dir, "intercept.npy"), mmap_mode="r")
+            classifier.t_ = entry["t_"]
+            intent_classifier.classifier = classifier
+        if "vectorizer" in entry:
+            vectorizer_dir = os.path.join(engine_dir, entry["vectorizer"])
+            fitted = intent_classifier.featurizer.tfidf_vectorizer._tfidf_vectorizer
+            fitted.vocabulary_ = MmapVocabulary(vectorizer_dir)
+            # A CSR diagonal over the mapped idf values; only the index arrays are allocated
+            idf = np.load(os.path.join(vectorizer_dir, "idf.npy"), mmap_mode="r")
+            n = len(idf)
+            fitted._tfidf._idf_diag = sp.csr_matrix(
+                (idf, np.arange(n, dtype=np.int32), np.arange(n + 1, dtype=np.int32)),
+                shape=(n, n), copy=False)
+    return engine
+
+
+# --- 4. EXPORT ---
+def export_mmap_engine(engine, out_dir, check_utterances=(), dataset_path=None):
+    """Persists a trained engine to out_dir in the mmap format and returns a report.
+
+    Like export_compact_engine, nothing is written unless the mmap engine
+    parses every check utterance exactly like the JSON one (ValueError),
+    and dataset_path is copied in for the exact-match fast path.
+    """
+    from snips_nlu import SnipsNLUEngine
+
+    if os.path.exists(out_dir):
+        raise FileExistsError(f"{out_dir} already exists")
+    staging_root = tempfile.mkdtemp(prefix="mmap-", dir=os.path.dirname(os.path.abspath(out_dir)))
+    try:
+        json_dir = os.path.join(staging_root, "json")
+        mmap_dir = os.path.join(staging_root, "mmap")
+        engine.persist(json_dir)
+        manifest = convert_engine_dir(json_dir, mmap_dir)
+
+        start = time.perf_counter()
+        json_engine = SnipsNLUEngine.from_path(json_dir)
+        json_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        mmap_engine = load_mmap_engine(mmap_dir)
+        mmap_seconds = time.perf_counter() - start
+
+        mismatches = [text for text in check_utterances
+                      if mmap_engine.parse(text) != json_engine.parse(text)]
+        if mismatches:
+            raise ValueError(f"mmap engine parses {len(mismatches)} utterance(s) differently, "
+                             f"e.g. {mismatches[0]!r}")
+        mapped_bytes = sum(os.path.getsize(os.path.join(dirpath, name))
+                           for dirpath, _, filenames in os.walk(mmap_dir)
+                           for name in filenames if name.endswith(".npy"))
+        report = {
+            "path": out_dir,
+            "classifiers": len(manifest["intent_parsers"]),
+            "mapped_bytes": mapped_bytes,
+            "load_seconds": {"json": json_seconds, "mmap": mmap_seconds},
+            "checked_utterances": len(check_utterances),
+        }
+        if dataset_path is not None:
+            shutil.copyfile(dataset_path, os.path.join(mmap_dir, DATASET_FILE))
+        os.rename(mmap_dir, out_dir)
+        return report
+    finally:
+        shutil.rmtree(staging_root, ignore_errors=True)
+
+
+def format_mmap_report(report):
+    return "\n".join([
+        f"Memory-mapped engine written to {report['path']}:",
+        f"  {report['classifiers']} intent classifier(s), {report['mapped_bytes']:,} bytes of mapped arrays",
+        f"  load time: {report['load_seconds']['json']:.3f}s (JSON) -> "
+        f"{report['load_seconds']['mmap']:.3f}s (mmap)",
+        f"  identical parses on {report['checked_utterances']} check utterance(s)",
+    ])
@@ -0,0 +1,70 @@
+# ====================================================================
+# parallel_training.py: Fits the per-intent CRF slot fillers in a process pool
+# Snips fits one slot filler per intent, one after another, all drawing
+# from a single shared RandomState. Here every intent gets its own seed
+# derived from (seed, intent name), so a filler only depends on its own
+# inputs: fitting them in 1 or N processes, in any order, gives the same
+# models. Workers hand their fillers back as persisted directories.
+# ====================================================================
+
+import hashlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+from copy import deepcopy
+
+from snips_nlu.slot_filler import SlotFiller
+
+# State inherited by forked workers (resources and entity parsers are not re-loaded)
+_WORKER_STATE = None
+
+
+def intent_seed(seed, intent_name):
+    """Deterministic per-intent seed, independent of the order intents are fitted in."""
+    digest = hashlib.sha256(f"{seed}:{intent_name}".encode("utf8")).hexdigest()
+    return int(digest[:8], 16)
+
+
+def _fit_one(dataset, intent_name, slot_filler_config, shared, seed):
+    # The config is copied because fitting may mutate it (same as ProbabilisticIntentParser.fit)
+    slot_filler = SlotFiller.from_config(deepcopy(slot_filler_config),
+                                         random_state=intent_seed(seed, intent_name), **shared)
+    return slot_filler.fit(dataset, intent_name)
+
+
+def _fit_in_worker(task):
+    intent_name, out_dir = task
+    dataset, slot_filler_config, shared, seed = _WORKER_STATE
+    _fit_one(dataset, intent_name, slot_filler_config, shared, seed).persist(out_dir)
+    return intent_name, out_dir
+
+
+def fit_slot_fillers(dataset, intent_names, slot_filler_config, shared, seed, workers=1):
+    """Fits one slot filler per intent and returns {intent_name: fitted slot filler}.
+
+    dataset must already be validated/formatted, and shared holds the fitted
+    builtin/custom entity parsers and the loaded resources. With workers > 1
+    the fits run in a fork pool; the result is the same as with workers=1.
+    """
+    global _WORKER_STATE
+    intent_names = sorted(intent_names)
+    workers = min(workers or os.cpu_count() or 1, len(intent_names))
+    if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return {name: _fit_one(dataset, name, slot_filler_config, shared, seed)
+                for name in intent_names}
+
+    out_root = tempfile.mkdtemp(prefix="slot-fillers-")
+    _WORKER_STATE = (dataset, slot_filler_config, shared, seed)
+    try:
+        tasks = [(name, os.path.join(out_root, f"slot_filler_{i}"))
+                 for i, name in enumerate(intent_names)]
+        slot_fillers = {}
+        with multiprocessing.get_context("fork").Pool(workers) as pool:
+            for name, path in pool.imap_unordered(_fit_in_worker, tasks):
+                # Loading copies the CRF model to its own temp file, so out_root can go
+                slot_fillers[name] = SlotFiller.load_from_path(path, **shared)
+        return {name: slot_fillers[name] for name in intent_names}
+    finally:
+        _WORKER_STATE = None
+        shutil.rmtree(out_root, ignore_errors=True)
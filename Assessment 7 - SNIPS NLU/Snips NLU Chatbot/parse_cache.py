@@ -0,0 +1,109 @@
+# ====================================================================
+# parse_cache.py: Bounded LRU cache in front of engine.parse
+# Keys are normalized utterances (casefolded, whitespace collapsed), so
+# repeated short commands like "lights on" / "Lights  ON" skip the full
+# featurize-and-classify pass.
+# ====================================================================
+
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_utterance(text):
+    """Casefolds the text and collapses all runs of whitespace to one space."""
+    return " ".join(text.casefold().split())
+
+
+class ParseCache:
+    """LRU + TTL cache of parsing results, flushed whenever the engine changes.
+
+    Misses parse the *normalized* utterance, so a cached result (including its
+    slot ranges) is always consistent with every input that maps to its key.
+    Returned results are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_size=1024, ttl_seconds=300.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._engine = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def clear(self):
+        """Drops every cached entry (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def _bind(self, engine):
+        # Caller holds the lock. A retrained or swapped engine invalidates everything.
+        if engine is not self._engine:
+            self._entries.clear()
+            self._engine = engine
+
+    def get(self, engine, text):
+        """Returns the cached result for text, or None on a miss."""
+        key = normalize_utterance(text)
+        now = self._clock()
+        with self._lock:
+            self._bind(engine)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, result = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, engine, text, result):
+        """Stores result for text, evicting the least recently used entries."""
+        key = normalize_utterance(text)
+        with self._lock:
+            self._bind(engine)
+            self._entries[key] = (self._clock() + self.ttl_seconds, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def parse(self, engine, text, parse_fn=None, on_hit=None):
+        """Drop-in replacement for engine.parse(text) that goes through the cache.
+
+        parse_fn(engine, text), if given, replaces engine.parse on a miss.
+        on_hit(result), if given, maps a cached result before it is returned
+        (e.g. to drop timings that belong to the parse that filled the entry).
+        """
+        result = self.get(engine, text)
+        if result is None:
+            key = normalize_utterance(text)
+            result = engine.parse(key) if parse_fn is None else parse_fn(engine, key)
+            self.put(engine, text, result)
+        elif on_hit is not None:
+            result = on_hit(result)
+        return result
+
+    def stats(self):
+        """Returns the cache counters as a dict."""
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
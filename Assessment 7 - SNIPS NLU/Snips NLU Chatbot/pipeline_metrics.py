@@ -0,0 +1,172 @@
+# ====================================================================
+# pipeline_metrics.py: Low-overhead latency histograms for the chat pipeline
+# Each stage (normalize, parse, dialogue, render) records its duration
+# into a fixed-bucket histogram; intents are counted per turn. The data
+# can be exported as Prometheus text or as a JSON snapshot.
+# ====================================================================
+
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# Upper bounds in seconds (the last bucket is +Inf)
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+PIPELINE_STAGES = ("normalize", "parse", "dialogue", "render")
+
+
+class Histogram:
+    """Fixed-bucket histogram: one bisect and two additions per observation.
+
+    Not locked by itself; PipelineMetrics serializes updates.
+    """
+
+    __slots__ = ("bounds", "counts", "total")
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.total += seconds
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def quantile(self, q, counts=None):
+        """Upper bound of the bucket holding the q-quantile (None when empty)."""
+        counts = self.counts if counts is None else counts
+        count = sum(counts)
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for bound, n in zip(self.bounds + (float("inf"),), counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class PipelineMetrics:
+    """Per-stage latency histograms plus per-intent turn counters.
+
+    A whole turn is recorded under a single lock acquisition.
+    """
+
+    def __init__(self, stages=PIPELINE_STAGES, bounds=DEFAULT_BUCKETS):
+        self.stages = {stage: Histogram(bounds) for stage in stages}
+        self._ordered = tuple(self.stages.values())
+        self.intents = Counter()
+        self._lock = threading.Lock()
+
+    def record_turn(self, intent_name, durations):
+        """Records one turn: durations are in the same order as the stages."""
+        with self._lock:
+            for hist, seconds in zip(self._ordered, durations):
+                hist.observe(seconds)
+            self.intents[intent_name] += 1
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.stages[stage].observe(seconds)
+
+    # --- Exporters ---
+    def snapshot(self):
+        """Returns a JSON-ready dict of every histogram and counter."""
+        stages = {}
+        for name, hist in self.stages.items():
+            with self._lock:
+                counts = list(hist.counts)
+                total = hist.total
+            count = sum(counts)
+            stages[name] = {
+                "count": count,
+                "sum_seconds": total,
+                "mean_seconds": total / count if count else None,
+                "p50_le": hist.quantile(0.50, counts),
+                "p95_le": hist.quantile(0.95, counts),
+                "p99_le": hist.quantile(0.99, counts),
+                "buckets": {str(b): c for b, c in zip(hist.bounds + ("+Inf",), counts)},
+            }
+        with self._lock:
+            intents = {str(k): v for k, v in self.intents.items()}
+        return {"stages": stages, "intents": intents}
+
+    def to_prometheus(self, prefix="chatbot"):
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {prefix}_stage_seconds Latency of each chat pipeline stage.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        for name, hist in self.stages.items():
+            with self._lock:
+                counts = list(hist.counts)
+                total = hist.total
+            cumulative = 0
+            for bound, n in zip(hist.bounds + ("+Inf",), counts):
+                cumulative += n
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {total}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {cumulative}')
+
+        lines.append(f"# HELP {prefix}_intent_total Turns per recognized intent (None = fallback).")
+        lines.append(f"# TYPE {prefix}_intent_total counter")
+        with self._lock:
+            intents = sorted(self.intents.items(), key=lambda kv: str(kv[0]))
+        for intent_name, n in intents:
+            lines.append(f'{prefix}_intent_total{{intent="{intent_name}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Atomically writes a JSON snapshot (*.json) or Prometheus text (anything else)."""
+        if path.endswith(".json"):
+            content = json.dumps(self.snapshot(), indent=2)
+        else:
+            content = self.to_prometheus()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+class MetricsDumper:
+    """Writes metrics to path from a helper thread whenever request() is called.
+
+    request() only sets a flag, so it is safe as a signal handler: the
+    interrupted thread may be holding the metrics lock inside record_turn.
+    """
+
+    def __init__(self, metrics, path, poll_seconds=0.25):
+        self.metrics = metrics
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self._requested = False
+        self._thread = threading.Thread(target=self._run, name="metrics-dump", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def request(self, signum=None, frame=None):
+        self._requested = True
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            if self._requested:
+                self._requested = False
+                try:
+                    self.metrics.write(self.path)
+                except OSError as e:
+                    print(f"Metrics dump to {self.path} failed: {e}", file=sys.stderr)
@@ -0,0 +1,253 @@
+# ====================================================================
+# prefork_server.py: N worker processes sharing one loaded engine
+# The master loads the engine, binds the listening socket, moves every
+# live object into the GC's permanent generation (gc.freeze) and forks
+# the workers. The engine pages stay shared copy-on-write: the cyclic GC
+# never touches frozen objects, so it does not dirty their pages. Each
+# worker runs the usual asyncio ChatServer on the inherited socket, and
+# the kernel spreads incoming connections across them.
+# The master restarts workers that die and reports each process's
+# resident and shared memory from /proc/<pid>/smaps_rollup (on start,
+# every report_seconds and on SIGUSR2), and forwards SIGUSR1 to every
+# worker (which ignore it unless worker_init installs a handler).
+# ====================================================================
+
+import asyncio
+import gc
+import os
+import random
+import signal
+import socket
+import sys
+import time
+
+from chat_server import ChatServer, serve_until_stopped
+
+# A worker that dies sooner than this after starting is restarted with a growing delay
+MIN_WORKER_LIFETIME = 1.0
+MAX_RESTART_DELAY = 30.0
+
+
+# --- 1. MEMORY ACCOUNTING ---
+def memory_usage(pid):
+    """Returns {rss_kb, pss_kb, shared_kb, private_kb} for pid, or None (non-Linux, dead pid)."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+            fields = {}
+            for line in f:
+                name, _, rest = line.partition(":")
+                parts = rest.split()
+                if len(parts) == 2 and parts[1] == "kB":
+                    fields[name] = int(parts[0])
+    except OSError:
+        return None
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "shared_kb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def format_memory_report(processes):
+    """processes: [(label, pid)]; returns a table of RSS / PSS / shared / private MB."""
+    lines = ["process\tpid\trss MB\tpss MB\tshared MB\tprivate MB"]
+    total_rss = total_pss = 0
+    for label, pid in processes:
+        usage = memory_usage(pid)
+        if usage is None:
+            lines.append(f"{label}\t{pid}\t(unavailable)")
+            continue
+        total_rss += usage["rss_kb"]
+        total_pss += usage["pss_kb"]
+        lines.append(f"{label}\t{pid}\t{usage['rss_kb'] / 1024:.1f}\t{usage['pss_kb'] / 1024:.1f}\t"
+                     f"{usage['shared_kb'] / 1024:.1f}\t\t{usage['private_kb'] / 1024:.1f}")
+    # PSS splits shared pages between their users, so its sum is the real footprint
+    lines.append(f"total\t\t{total_rss / 1024:.1f}\t{total_pss / 1024:.1f}")
+    return "\n".join(lines)
+
+
+# --- 2. THE MASTER ---
+class PreforkServer:
+    """Forks `workers` ChatServer processes on one shared listening socket.
+
+    process_turn and the other ChatServer arguments are inherited by every
+    worker. worker_init(slot) runs in the worker right after the fork (for
+    per-process state such as threads), worker_exit(slot) before it exits.
+    Metrics and sessions are per worker: the kernel hands each connection
+    to any worker, so session state only carries over between turns that
+    reach the same one. Clients must keep a session on one keep-alive
+    connection, or sit behind a load balancer that routes by session_id.
+    """
+
+    def __init__(self, process_turn, host="127.0.0.1", port=8080, workers=4,
+                 threads=4, max_pending=64, metrics=None, health=None, tenants=None,
+                 worker_init=None, worker_exit=None, report_seconds=None, grace_seconds=10.0):
+        if not hasattr(os, "fork"):
+            raise RuntimeError("the pre-fork server needs os.fork (Linux/macOS)")
+        self.process_turn = process_turn
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.max_pending = max_pending
+        self.metrics = metrics
+        self.health = health
+        self.tenants = tenants
+        self.worker_init = worker_init
+        self.worker_exit = worker_exit
+        self.report_seconds = report_seconds
+        self.grace_seconds = grace_seconds
+        self._sock = None
+        self._children = {}  # pid -> (slot, started_at)
+        self._failures = [0] * workers  # consecutive early deaths per slot
+        self._stopping = False
+        self._report_requested = False
+        self._forward_requested = False
+        self.restarts = 0
+
+    # --- Worker side ---
+    def _worker_health(self, slot):
+        stats = dict(self.health()) if self.health is not None else {}
+        stats.update({"worker_slot": slot, "worker_pid": os.getpid(),
+                      "worker_memory": memory_usage(os.getpid())})
+        return stats
+
+    def _run_worker(self, slot):
+        """Body of a forked worker; never returns into the master's code."""
+        code = 0
+        try:
+            for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGUSR2):
+                signal.signal(sig, signal.SIG_DFL)
+            signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+            random.seed()  # Do not replay the master's random sequence in every worker
+            if self.worker_init is not None:
+                self.worker_init(slot)
+            server = ChatServer(self.process_turn, host=self.host, port=self.port,
+                                workers=self.threads, max_pending=self.max_pending,
+                                grace_seconds=self.grace_seconds, metrics=self.metrics,
+                                health=lambda: self._worker_health(slot), tenants=self.tenants)
+            asyncio.run(serve_until_stopped(server, sock=self._sock))
+        except BaseException as e:
+            if not isinstance(e, KeyboardInterrupt):
+                print(f"[prefork] worker {slot} failed: {type(e).__name__}: {e}")
+                code = 1
+        finally:
+            try:
+                if self.worker_exit is not None:
+                    self.worker_exit(slot)
+            finally:
+                # os._exit skips the normal interpreter shutdown, so flush by hand
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+
+    # --- Master side ---
+    def _spawn(self, slot):
+        # Objects created since the last fork (e.g. by a restart) are frozen too
+        gc.collect()
+        gc.freeze()
+        sys.stdout.flush()  # or the child would print the master's buffered output again
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker(slot)
+        self._children[pid] = (slot, time.monotonic())
+        return pid
+
+    def _reap(self):
+        """Collects dead workers and restarts them (with backoff if they die right away)."""
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot, started_at = self._children.pop(pid, (None, None))
+            if slot is None or self._stopping:
+                continue
+            lived = time.monotonic() - started_at
+            self._failures[slot] = self._failures[slot] + 1 if lived < MIN_WORKER_LIFETIME else 0
+            delay = min(MAX_RESTART_DELAY, 0.5 * (2 ** self._failures[slot] - 1))
+            print(f"[prefork] worker {slot} (pid {pid}) exited with status {status} "
+                  f"after {lived:.1f}s; restarting in {delay:.1f}s")
+            if delay:
+                time.sleep(delay)
+            self.restarts += 1
+            self._spawn(slot)
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    def _request_report(self, signum, frame):
+        self._report_requested = True
+
+    def _request_forward(self, signum, frame):
+        self._forward_requested = True
+
+    def _signal_workers(self, sig):
+        for pid in list(self._children):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def memory_report(self):
+        processes = [("master", os.getpid())]
+        processes += [(f"worker {slot}", pid) for pid, (slot, _) in sorted(
+            self._children.items(), key=lambda item: item[1][0])]
+        return format_memory_report(processes)
+
+    def run(self):
+        """Binds, forks the workers and supervises them until SIGINT/SIGTERM."""
+        self._sock = socket.create_server((self.host, self.port), backlog=1024)
+        self.port = self._sock.getsockname()[1]
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGUSR2, self._request_report)
+        signal.signal(signal.SIGUSR1, self._request_forward)
+
+        for slot in range(self.workers):
+            self._spawn(slot)
+        print(f"[prefork] master {os.getpid()} serving http://{self.host}:{self.port}/chat "
+              f"with {self.workers} worker(s) (kill -USR2 {os.getpid()} for a memory report)")
+
+        next_report = time.monotonic() + 2.0  # first report once the workers are up
+        try:
+            while not self._stopping:
+                self._reap()
+                if self._forward_requested:
+                    self._forward_requested = False
+                    self._signal_workers(signal.SIGUSR1)
+                now = time.monotonic()
+                if self._report_requested or (next_report is not None and now >= next_report):
+                    self._report_requested = False
+                    print(self.memory_report())
+                    next_report = now + self.report_seconds if self.report_seconds else None
+                time.sleep(0.2)
+        finally:
+            self._shutdown()
+
+    def _shutdown(self):
+        """SIGTERM to every worker (they drain in-flight turns), SIGKILL after the grace period."""
+        self._stopping = True
+        self._signal_workers(signal.SIGTERM)
+        deadline = time.monotonic() + self.grace_seconds + 1.0
+        while self._children and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self._children.pop(pid, None)
+            else:
+                time.sleep(0.05)
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self._children.clear()
+        self._sock.close()
+        print(f"[prefork] stopped ({self.restarts} worker restart(s)).")
@@ -0,0 +1,136 @@
+# ====================================================================
+# session_store.py: Per-session conversation context
+# Replaces the old module-level SESSION_CONTEXT dict so one process can
+# hold many independent conversations. The store is split into shards,
+# each with its own lock and LRU order, so threads serving different
+# sessions rarely contend.
+# ====================================================================
+
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_USER_NAME = "Valued User"
+
+
+class Session:
+    """Context of one conversation. __slots__ keeps each record small."""
+
+    __slots__ = ("session_id", "user_name", "last_room", "last_seen")
+
+    def __init__(self, session_id, now):
+        self.session_id = session_id
+        self.user_name = DEFAULT_USER_NAME
+        self.last_room = None
+        self.last_seen = now
+
+    def __repr__(self):
+        return (f"Session({self.session_id!r}, user_name={self.user_name!r}, "
+                f"last_room={self.last_room!r})")
+
+
+class _Shard:
+    __slots__ = ("lock", "sessions")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()  # session_id -> Session, least recently used first
+
+
+class SessionStore:
+    """Thread-safe, sharded session store with idle TTL and a size cap.
+
+    max_sessions bounds memory: once a shard holds its share of the cap, its
+    least recently used session is evicted to make room for a new one.
+    """
+
+    def __init__(self, num_shards=16, ttl_seconds=1800.0, max_sessions=100_000,
+                 clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._clock = clock
+        self._shards = [_Shard() for _ in range(num_shards)]
+        self._shard_cap = max(1, -(-max_sessions // num_shards))
+        self._counter_lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _shard(self, session_id):
+        return self._shards[hash(session_id) % len(self._shards)]
+
+    def _count(self, created=0, expired=0, evicted=0):
+        with self._counter_lock:
+            self.created += created
+            self.expired += expired
+            self.evicted += evicted
+
+    def get(self, session_id):
+        """Returns the live session for session_id, creating it if needed."""
+        now = self._clock()
+        shard = self._shard(session_id)
+        created = expired = evicted = 0
+        with shard.lock:
+            sessions = shard.sessions
+            session = sessions.get(session_id)
+            if session is not None and now - session.last_seen > self.ttl_seconds:
+                del sessions[session_id]
+                session = None
+                expired += 1
+
+            if session is None:
+                # Idle sessions sit at the front of the LRU order, so drop those first
+                while sessions:
+                    oldest = next(iter(sessions.values()))
+                    if now - oldest.last_seen <= self.ttl_seconds:
+                        break
+                    sessions.popitem(last=False)
+                    expired += 1
+                while len(sessions) >= self._shard_cap:
+                    sessions.popitem(last=False)
+                    evicted += 1
+                session = Session(session_id, now)
+                sessions[session_id] = session
+                created = 1
+            else:
+                session.last_seen = now
+                sessions.move_to_end(session_id)
+
+        if created or expired or evicted:
+            self._count(created=created, expired=expired, evicted=evicted)
+        return session
+
+    def drop(self, session_id):
+        """Forgets a session (e.g. when the user says goodbye)."""
+        shard = self._shard(session_id)
+        with shard.lock:
+            shard.sessions.pop(session_id, None)
+
+    def sweep(self):
+        """Removes every idle session; returns how many were dropped."""
+        now = self._clock()
+        dropped = 0
+        for shard in self._shards:
+            with shard.lock:
+                sessions = shard.sessions
+                while sessions:
+                    oldest = next(iter(sessions.values()))
+                    if now - oldest.last_seen <= self.ttl_seconds:
+                        break
+                    sessions.popitem(last=False)
+                    dropped += 1
+        self._count(expired=dropped)
+        return dropped
+
+    def __len__(self):
+        return sum(len(shard.sessions) for shard in self._shards)
+
+    def stats(self):
+        """Returns the store counters as a dict."""
+        return {
+            "active": len(self),
+            "max_sessions": self.max_sessions,
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,50 @@
+# ====================================================================
+# startup_profile.py: Where the time goes between `python chatbot_app.py`
+# and the first turn it can answer (--startup-profile).
+# Phases are timed back to back; the heavy scientific stack is imported
+# module by module so its share of the import time is visible.
+# ====================================================================
+
+import importlib
+import sys
+import time
+from contextlib import contextmanager
+
+# snips_nlu's import chain, heaviest dependencies first
+HEAVY_MODULES = ("numpy", "scipy.sparse", "sklearn.linear_model", "snips_nlu")
+
+
+class StartupProfile:
+    """Ordered (phase, seconds) timings since `started` (a perf_counter value)."""
+
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self.phases = []
+
+    def add(self, label, seconds):
+        self.phases.append((label, seconds))
+
+    @contextmanager
+    def phase(self, label):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(label, time.perf_counter() - start)
+
+    def import_heavy(self):
+        """Imports the snips_nlu stack one module at a time (already imported ones cost ~0)."""
+        for name in HEAVY_MODULES:
+            with self.phase(f"import {name}"):
+                importlib.import_module(name)
+
+    def report(self):
+        total = time.perf_counter() - self.started
+        lines = ["--- Startup profile ---"]
+        for label, seconds in self.phases:
+            lines.append(f"  {label:<32}{seconds:>8.3f}s  {seconds / total:>6.1%}")
+        lines.append(f"  {'total to ready':<32}{total:>8.3f}s")
+        return "\n".join(lines)
+
+    def print(self, file=sys.stderr):
+        print(self.report(), file=file)
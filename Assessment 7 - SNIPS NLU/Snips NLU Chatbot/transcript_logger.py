@@ -0,0 +1,174 @@
+# ====================================================================
+# transcript_logger.py: Off-the-response-path conversation transcripts
+# A turn only appends a tuple to a queue.SimpleQueue (no Python-level
+# lock, no I/O, no JSON). A background thread drains the queue in
+# batches, serializes the records and appends them to gzip-compressed
+# JSONL segments that rotate by size. Finished segments are renamed
+# from *.jsonl.gz.open to *.jsonl.gz, so readers never see a partial one.
+# ====================================================================
+
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+_STOP = object()
+
+
+class TranscriptLogger:
+    """Buffered, non-blocking JSONL transcript writer.
+
+    log() never blocks: when more than max_pending records are waiting the
+    record is dropped and counted instead (the count is approximate under
+    heavy contention). A segment is rotated after the batch that takes it
+    past max_segment_bytes of uncompressed JSONL. flush() waits until everything
+    logged so far is on disk; close() flushes, finishes the open segment
+    and stops the writer thread.
+    """
+
+    def __init__(self, directory, max_segment_bytes=16 << 20, batch_size=512,
+                 flush_seconds=1.0, max_pending=100_000, compresslevel=6,
+                 timing_fields=None, prefix="transcript"):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.compresslevel = compresslevel
+        self.timing_fields = tuple(timing_fields) if timing_fields else None
+        self.prefix = prefix
+        os.makedirs(directory, exist_ok=True)
+
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._file = None
+        self._path = None
+        self._segment_bytes = 0
+        self._segment_index = 0
+        self.dropped = 0
+        self.written = 0
+        self.segments = 0
+        self.write_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+        self._thread.start()
+
+    # --- Producer side (runs on the turn's thread) ---
+    def log(self, session_id, text, turn, timings=None, tenant_id=None):
+        """Queues one turn; the turn dict must not be mutated afterwards."""
+        if self._closed or self._queue.qsize() >= self.max_pending:
+            self.dropped += 1
+            return
+        self._queue.put((time.time(), session_id, tenant_id, text, turn, timings))
+
+    def flush(self, timeout=None):
+        """Blocks until every record logged before the call is written; returns True if so."""
+        if self._closed:
+            return not self._thread.is_alive()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Writes what is queued, finishes the current segment and stops the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "pending": self._queue.qsize(),
+            "segments": self.segments,
+            "write_seconds": self.write_seconds,
+        }
+
+    # --- Writer side (background thread) ---
+    def _record(self, item):
+        ts, session_id, tenant_id, text, turn, timings = item
+        record = {"ts": ts, "session_id": session_id}
+        if tenant_id is not None:
+            record["tenant_id"] = tenant_id
+        record["text"] = text
+        record["intent"] = turn.get("intent")
+        record["probability"] = turn.get("probability")
+        record["slots"] = turn.get("slots")
+        record["response"] = turn.get("response")
+        if timings is not None:
+            record["timings"] = dict(zip(self.timing_fields, timings)) if self.timing_fields else timings
+        return json.dumps(record, ensure_ascii=False)
+
+    def _open_segment(self):
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self._segment_index += 1
+        name = f"{self.prefix}-{stamp}-{os.getpid()}-{self._segment_index:04d}.jsonl.gz"
+        self._path = os.path.join(self.directory, name)
+        self._file = gzip.open(self._path + ".open", "wb", compresslevel=self.compresslevel)
+        self._segment_bytes = 0
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(self._path + ".open", self._path)
+        self._file = None
+        self.segments += 1
+
+    def _write(self, lines):
+        start = time.perf_counter()
+        if self._file is None:
+            self._open_segment()
+        data = ("\n".join(lines) + "\n").encode("utf8")
+        self._file.write(data)
+        self._segment_bytes += len(data)
+        if self._segment_bytes >= self.max_segment_bytes:
+            self._close_segment()
+        self.written += len(lines)
+        self.write_seconds += time.perf_counter() - start
+
+    def _sync(self):
+        # Push buffered data through zlib so an idle or flushed segment is readable up to here
+        if self._file is not None:
+            self._file.flush()
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_seconds)]
+            except queue.Empty:
+                self._sync()
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines, waiters, stop = [], [], False
+            for item in batch:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    lines.append(self._record(item))
+            try:
+                if lines:
+                    self._write(lines)
+                if waiters:
+                    self._sync()
+                if stop:
+                    self._close_segment()
+            except OSError as e:
+                # Keep serving turns even if the disk is full; the lost records are counted
+                self.dropped += len(lines)
+                print(f"[transcript] write failed: {e}")
+            for done in waiters:
+                done.set()
+            if stop:
+                return
@@ -0,0 +1,142 @@
+# ====================================================================
+# bench_metrics.py: Vectorized metrics core vs the sklearn report path
+# Synthetic predictions (30 intents, ~90% correct, a few slots each) are
+# scored both ways: sklearn's accuracy_score + classification_report +
+# confusion_matrix with a Python full-match loop, and nlu_metrics
+# (encode once, one bincount, masks). Encoding is timed on its own.
+# Slot spans: SlotSpanAccumulator vs seqeval (if installed) on the same
+# synthetic BIO-tagged utterances.
+# Run: python bench_metrics.py
+# ====================================================================
+
+import random
+import time
+
+from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+
+from nlu_metrics import IntentMetrics, LabelIndex, SlotSpanAccumulator, full_match_mask, slot_key
+
+SIZES = (10_000, 100_000, 1_000_000)
+INTENTS = [f"intent{i:02d}" for i in range(30)] + ["None"]
+SLOT_VALUES = [("room", "kitchen"), ("room", "living_room"), ("city", "london"), ("city", "paris")]
+SPAN_SIZES = (10_000, 100_000)
+WORDS = "please turn the lights on in my living room kitchen weather for paris".split()
+
+
+def synthetic(n, seed=0):
+    rng = random.Random(seed)
+    true_intents, pred_intents, true_slots, pred_slots = [], [], [], []
+    for _ in range(n):
+        intent = rng.choice(INTENTS[:-1])
+        slots = sorted(rng.sample(SLOT_VALUES, rng.randint(0, 2)))
+        true_intents.append(intent)
+        true_slots.append(slots)
+        pred_intents.append(intent if rng.random() < 0.9 else rng.choice(INTENTS))
+        pred_slots.append(slots if rng.random() < 0.95 else slots[:-1])
+    return true_intents, pred_intents, true_slots, pred_slots
+
+
+def sklearn_path(true_intents, pred_intents, true_slots, pred_slots):
+    full_match = sum(1 for i in range(len(true_intents))
+                     if pred_intents[i] == true_intents[i] and pred_slots[i] == true_slots[i])
+    accuracy_score(true_intents, pred_intents)
+    classification_report(true_intents, pred_intents, zero_division=0)
+    confusion_matrix(true_intents, pred_intents, labels=sorted(set(true_intents + pred_intents)))
+    return full_match
+
+
+def encode(true_intents, pred_intents, true_slots, pred_slots):
+    intents, slot_lists = LabelIndex(), LabelIndex()
+    return (intents, intents.encode(true_intents), intents.encode(pred_intents),
+            slot_lists.encode(map(slot_key, true_slots)), slot_lists.encode(map(slot_key, pred_slots)))
+
+
+def vectorized_path(intents, true_codes, pred_codes, true_slot_codes, pred_slot_codes):
+    full_match = int(full_match_mask(true_codes, pred_codes, true_slot_codes, pred_slot_codes).sum())
+    metrics = IntentMetrics.from_codes(intents, true_codes, pred_codes)
+    metrics.classification_report()
+    metrics.confusion_table()
+    return full_match
+
+
+def synthetic_spans(n, seed=0):
+    """[(text, true spans, predicted spans)] with one or two slots per utterance."""
+    rng = random.Random(seed)
+    examples = []
+    for _ in range(n):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(4, 12))]
+        text = " ".join(words)
+        starts = [sum(len(w) + 1 for w in words[:i]) for i in range(len(words))]
+        spans = []
+        for slot in rng.sample(("room", "city"), rng.randint(1, 2)):
+            first = rng.randrange(len(words))
+            last = min(len(words) - 1, first + rng.randint(0, 1))
+            if all(end <= starts[first] or start > starts[last] for _, start, end in spans):
+                spans.append((slot, starts[first], starts[last] + len(words[last])))
+        predicted = [s if rng.random() < 0.8 else (s[0], s[1], s[2] - 1 if s[2] - s[1] > 1 else s[2])
+                     for s in spans if rng.random() < 0.9]
+        examples.append((text, spans, predicted))
+    return examples
+
+
+def spans_vectorized(examples):
+    accumulator = SlotSpanAccumulator()
+    for text, spans, predicted in examples:
+        accumulator.add(text, spans, predicted)
+    return accumulator.scores("strict")[1][2]
+
+
+def _string_tags(text, spans):
+    tags, position, previous = [], 0, None
+    for word in text.split(" "):
+        tag, current = "O", None
+        for i, (slot, start, end) in enumerate(spans):
+            if position < end and position + len(word) > start:
+                tag, current = ("I-" if previous == i else "B-") + slot, i
+        tags.append(tag)
+        previous = current
+        position += len(word) + 1
+    return tags
+
+
+def spans_seqeval(examples):
+    from seqeval.metrics import classification_report as seq_classification_report, f1_score
+    true = [_string_tags(text, spans) for text, spans, _ in examples]
+    pred = [_string_tags(text, predicted) for text, _, predicted in examples]
+    seq_classification_report(true, pred, zero_division=0)
+    return f1_score(true, pred)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    print("--- Intent report + confusion matrix + full match ---")
+    print("examples\tsklearn (s)\tencode (s)\tvectorized (s)\tspeedup (incl. encode)")
+    for n in SIZES:
+        data = synthetic(n)
+        expected, t_sklearn = timed(sklearn_path, *data)
+        encoded, t_encode = timed(encode, *data)
+        full_match, t_vector = timed(vectorized_path, *encoded)
+        assert full_match == expected
+        print(f"{n}\t\t{t_sklearn:.3f}\t\t{t_encode:.3f}\t\t{t_vector:.4f}\t\t"
+              f"{t_sklearn / t_vector:.0f}x ({t_sklearn / (t_encode + t_vector):.1f}x)")
+
+    try:
+        import seqeval  # noqa: F401  Only for the comparison
+    except ImportError:
+        seqeval = None
+    print("\n--- Slot span F1 (strict) ---")
+    print("utterances\tSlotSpanAccumulator (s)\tseqeval (s)")
+    for n in SPAN_SIZES:
+        examples = synthetic_spans(n)
+        f1, t_spans = timed(spans_vectorized, examples)
+        if seqeval is None:
+            print(f"{n}\t\t{t_spans:.3f}\t\t\t(seqeval not installed)")
+            continue
+        seq_f1, t_seqeval = timed(spans_seqeval, examples)
+        assert abs(f1 - seq_f1) < 1e-9, (f1, seq_f1)
+        print(f"{n}\t\t{t_spans:.3f}\t\t\t{t_seqeval:.3f}")
@@ -1,98 +1,471 @@
 # ====================================================================
-# evaluate_nlu.py: Full Code for NLU Evaluation 
-# NOTE: This code requires 'snips-nlu', 'scikit-learn', and 'seqeval' libraries.
+# evaluate_nlu.py: Full Code for NLU Evaluation
+# NOTE: This code requires the 'snips-nlu' and 'numpy' libraries
+# (scikit-learn only for bench_metrics.py).
 # ====================================================================
 
+import argparse
+import collections
+import gc
 import io
+import itertools
 import json
+import multiprocessing
+import os
+import random
+import signal
+import statistics
+import sys
+import time
 import warnings
-# You would need to install snips_nlu for this part to work:
-# from snips_nlu import SnipsNLUEngine 
-# from snips_nlu.default_configs import CONFIG_EN
 
-from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
-# For Entity Evaluation, install and use seqeval:
-# from seqeval.metrics import classification_report as seq_classification_report 
+from nlu_metrics import (IntentMetrics, LabelIndex, MetricsAccumulator, SlotSpanAccumulator,
+                         full_match_mask, slot_key)
+
+# Label used when the engine returns no intent (intentName None)
+NO_INTENT = "None"
 
 # --- NLU ENGINE SETUP AND TRAINING ---
-def train_engine():
-    """Loads the dataset.json and trains the NLU engine."""
-    # Placeholder for actual training logic
-    # ... Your Snips NLU training code here ...
-    print("Training Complete (requires snips-nlu library).")
-    return None # Returns the trained engine
+def fit_engine(dataset, seed=None):
+    """Trains a SnipsNLUEngine on a dataset dict."""
+    from snips_nlu import SnipsNLUEngine
+    from snips_nlu.default_configs import CONFIG_EN
 
-# --- EVALUATION CORE FUNCTION ---
-# evaluate_nlu.py
+    engine = SnipsNLUEngine(config=CONFIG_EN, random_state=seed)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        engine.fit(dataset)
+    return engine
 
-import io
-import json
-import warnings
-# Requires: snips_nlu, scikit-learn
-# from snips_nlu import SnipsNLUEngine
-# from snips_nlu.default_configs import CONFIG_EN
+def train_engine(dataset_path="dataset.json", engine_dir=None, seed=None):
+    """Loads the engine persisted in engine_dir, or trains it on dataset_path.
+
+    A freshly trained engine is persisted to engine_dir (if given), so the
+    next evaluation of the same model skips training.
+    """
+    start = time.perf_counter()
+    if engine_dir and os.path.isdir(engine_dir):
+        from snips_nlu import SnipsNLUEngine
+        engine = SnipsNLUEngine.from_path(engine_dir)
+        print(f"Loaded engine from {engine_dir} in {time.perf_counter() - start:.2f}s.")
+        return engine
+
+    with io.open(dataset_path, encoding="utf8") as f:
+        dataset = json.load(f)
+    engine = fit_engine(dataset, seed)
+    print(f"Training Complete ({dataset_path}, {time.perf_counter() - start:.2f}s).")
+    if engine_dir:
+        engine.persist(engine_dir)
+        print(f"Engine saved to {engine_dir}.")
+    return engine
+
+# --- TEST DATA AND PREDICTIONS ---
+def _iter_json_array(f, read_size=1 << 16):
+    """Yields the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    started = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("expected a JSON array of test examples")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield item
+                pos = end
+                continue
+        elif eof:
+            raise ValueError("unexpected end of the test data file")
+        chunk = f.read(read_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+def _truth_spans(utterance, slots):
+    """(slotName, start, end) of each true slot, from its Snips "range" or by finding its "rawValue".
+
+    None when a slot has neither: the example then has no token-level truth.
+    """
+    spans, search_from = [], 0
+    lowered = utterance.lower()
+    for slot in slots:
+        if "range" in slot:
+            start, end = slot["range"]["start"], slot["range"]["end"]
+        elif "rawValue" in slot:
+            raw = slot["rawValue"].lower()
+            start = lowered.find(raw, search_from)
+            if start < 0:
+                start = lowered.find(raw)
+            if start < 0:
+                return None
+            end = start + len(raw)
+        else:
+            return None
+        spans.append((slot["slotName"], start, end))
+        search_from = end
+    return spans
+
+def _test_example(record):
+    slots = record.get("slots", [])
+    return (record["utterance"], record["intent"] or NO_INTENT,
+            sorted((slot["slotName"], slot["value"]) for slot in slots),
+            _truth_spans(record["utterance"], slots))
+
+def iter_test_examples(test_file_path):
+    """Streams (utterance, intent, slots, spans) from test_data.json or a JSONL file of the same records.
+
+    slots are sorted (slotName, value) pairs, spans (slotName, start, end)
+    character ranges or None. Only one record is decoded at a time, so the
+    file can be far larger than memory.
+    """
+    with io.open(test_file_path, encoding="utf8") as f:
+        if test_file_path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield _test_example(json.loads(line))
+        else:
+            for record in _iter_json_array(f):
+                yield _test_example(record)
+
+def prediction_from_parse(result):
+    """(intent, sorted (slotName, value) pairs, (slotName, start, end) spans) from an engine.parse result.
+
+    Custom entities count by their reference value ("den" -> "living_room"),
+    builtin ones (numbers, dates) by the text that matched.
+    """
+    intent = result["intent"]["intentName"] or NO_INTENT
+    slots, spans = [], []
+    for slot in result["slots"]:
+        value = slot["value"]
+        custom = isinstance(value, dict) and value.get("kind") == "Custom"
+        slots.append((slot["slotName"], value["value"] if custom else slot["rawValue"]))
+        spans.append((slot["slotName"], slot["range"]["start"], slot["range"]["end"]))
+    return intent, sorted(slots), spans
+
+# Engine inherited by forked scoring workers; set right before the pool forks.
+_WORKER_ENGINE = None
+
+def _score_chunk(chunk):
+    """Parses a chunk of test examples and returns their MetricsAccumulator."""
+    accumulator = MetricsAccumulator()
+    for utterance, intent, slots, spans in chunk:
+        pred_intent, pred_slots, pred_spans = prediction_from_parse(_WORKER_ENGINE.parse(utterance))
+        accumulator.add(intent, pred_intent, slots, pred_slots)
+        accumulator.add_spans(utterance, spans, pred_spans)
+    return accumulator
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def score_stream(engine, examples, workers=None, chunk_size=256, progress_every=None):
+    """Scores a stream of test examples and returns the merged MetricsAccumulator.
+
+    Chunks are parsed and scored by a forked process pool (the engine is
+    loaded before the fork, so it is shared copy-on-write, never pickled);
+    each worker sends back only its chunk's counts. At most two chunks per
+    worker are in flight, so memory does not grow with the test set.
+    With progress_every, a running summary is printed every that many examples;
+    `kill -USR1 <pid>` prints the full report so far.
+    """
+    global _WORKER_ENGINE
+    workers = workers or os.cpu_count() or 1
+    if "fork" not in multiprocessing.get_all_start_methods():
+        # e.g. Windows: spawned workers would have to retrain or reload the engine
+        workers = 1
+    total = MetricsAccumulator()
+    next_progress = progress_every
+    report_requested = []
+
+    def merge(accumulator):
+        nonlocal next_progress
+        total.merge(accumulator)
+        if next_progress and total.examples >= next_progress:
+            print(f"  ... {total.summary()}")
+            next_progress = (total.examples // progress_every + 1) * progress_every
+        if report_requested:
+            report_requested.clear()
+            print_report(total)
+
+    start = time.perf_counter()
+    _WORKER_ENGINE = engine
+    previous_handler = None
+    if hasattr(signal, "SIGUSR1"):
+        previous_handler = signal.signal(signal.SIGUSR1, lambda signum, frame: report_requested.append(True))
+    try:
+        if workers == 1:
+            for chunk in _chunks(examples, chunk_size):
+                merge(_score_chunk(chunk))
+        else:
+            # Keep the loaded model out of the GC's reach so its pages are not dirtied in workers
+            gc.freeze()
+            try:
+                with multiprocessing.get_context("fork").Pool(workers) as pool:
+                    pending = collections.deque()
+                    for chunk in _chunks(examples, chunk_size):
+                        pending.append(pool.apply_async(_score_chunk, (chunk,)))
+                        if len(pending) >= 2 * workers:
+                            merge(pending.popleft().get())
+                    while pending:
+                        merge(pending.popleft().get())
+            finally:
+                gc.unfreeze()
+    finally:
+        _WORKER_ENGINE = None
+        if previous_handler is not None:
+            signal.signal(signal.SIGUSR1, previous_handler)
+    elapsed = time.perf_counter() - start
+    rate = total.examples / elapsed if elapsed else float("inf")
+    print(f"Parsed {total.examples} test utterances with {workers} worker(s) in {elapsed:.2f}s ({rate:.0f} utt/s).")
+    return total
+
+# --- K-FOLD CROSS-VALIDATION ---
+def dataset_examples(dataset, intent_name, utterance):
+    """(utterance, intent, slots, spans) for a dataset utterance, with slots resolved like prediction_from_parse."""
+    text = "".join(chunk["text"] for chunk in utterance["data"])
+    slots, spans, position = [], [], 0
+    for chunk in utterance["data"]:
+        position += len(chunk["text"])
+        if "slot_name" not in chunk:
+            continue
+        spans.append((chunk["slot_name"], position - len(chunk["text"]), position))
+        value = chunk["text"]
+        entity = dataset["entities"].get(chunk["entity"])
+        if entity and "data" in entity:
+            # Entity matching is case-insensitive and maps synonyms to the reference value;
+            # builtin entities ("snips/number": {}) have no values and keep the raw text
+            for entry in entity["data"]:
+                names = [entry["value"]] + (entry["synonyms"] if entity.get("use_synonyms", True) else [])
+                if value.lower() in (name.lower() for name in names):
+                    value = entry["value"]
+                    break
+        slots.append((chunk["slot_name"], value))
+    return text, intent_name, sorted(slots), spans
 
-from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
+def stratified_folds(dataset, k, seed=0):
+    """Returns {intent: [fold index of each utterance]}.
 
-# --- NLU ENGINE SETUP AND TRAINING (Use your Snips NLU logic here) ---
-# def train_engine():
-#     ... (Implementation from chatbot_app.py) ...
-#     return trained_engine
+    Each intent's utterances are shuffled and dealt round-robin, so every
+    fold gets a near-equal share of every intent.
+    """
+    rng = random.Random(seed)
+    assignment = {}
+    for intent_name in sorted(dataset["intents"]):
+        n = len(dataset["intents"][intent_name]["utterances"])
+        order = list(range(n))
+        rng.shuffle(order)
+        folds = [0] * n
+        offset = rng.randrange(k)  # so small intents do not all land in the first folds
+        for position, index in enumerate(order):
+            folds[index] = (position + offset) % k
+        assignment[intent_name] = folds
+    return assignment
+
+def split_fold(dataset, assignment, fold):
+    """(training dataset, test examples) of one fold."""
+    train = dict(dataset, intents={})
+    test = []
+    for intent_name, intent in dataset["intents"].items():
+        kept = []
+        for utterance, utterance_fold in zip(intent["utterances"], assignment[intent_name]):
+            if utterance_fold == fold:
+                test.append(dataset_examples(dataset, intent_name, utterance))
+            else:
+                kept.append(utterance)
+        train["intents"][intent_name] = dict(intent, utterances=kept)
+    return train, test
+
+def fold_metrics(examples, predictions):
+    """Intent accuracy, macro F1, per-intent F1, full-match accuracy and strict slot span F1 of one fold."""
+    intent_metrics, full_match = score_predictions(examples, predictions)
+    # Only the intents this fold tests count towards its F1 scores
+    f1 = intent_metrics.f1_by_label(sorted({intent for _, intent, _, _ in examples}))
+    spans = SlotSpanAccumulator()
+    for (text, _, _, true_spans), (_, _, pred_spans) in zip(examples, predictions):
+        spans.add(text, true_spans, pred_spans)
+    return {
+        "examples": len(examples),
+        "intent_accuracy": intent_metrics.accuracy,
+        "intent_macro_f1": sum(f1.values()) / len(f1) if f1 else 0.0,
+        "intent_f1": f1,
+        "full_match_accuracy": float(full_match.mean()) if len(examples) else 0.0,
+        "slot_f1": spans.scores("strict")[1][2],
+    }
+
+# Dataset and fold assignment inherited by forked fold workers; set right before the pool forks.
+_CV_STATE = None
+
+def _run_fold(fold):
+    dataset, assignment, seed = _CV_STATE
+    start = time.perf_counter()
+    train, test = split_fold(dataset, assignment, fold)
+    engine = fit_engine(train, seed)
+    predictions = [prediction_from_parse(engine.parse(text)) for text, *_ in test]
+    metrics = fold_metrics(test, predictions)
+    metrics.update(fold=fold, train_examples=sum(len(i["utterances"]) for i in train["intents"].values()),
+                   seconds=time.perf_counter() - start)
+    return metrics
+
+def cross_validate(dataset, k=5, seed=None, max_parallel=None):
+    """Trains and evaluates k stratified folds, at most max_parallel at a time; returns per-fold metrics.
+
+    Each fold runs in its own process, which exits after that fold
+    (maxtasksperchild=1), so peak memory is about max_parallel engines.
+    """
+    global _CV_STATE
+    if k < 2:
+        raise ValueError("--cv needs at least 2 folds")
+    for intent_name, intent in dataset["intents"].items():
+        if len(intent["utterances"]) < k:
+            print(f"Warning: intent '{intent_name}' has {len(intent['utterances'])} utterance(s), "
+                  f"fewer than {k} folds; some folds will not test it.")
+    assignment = stratified_folds(dataset, k, seed or 0)
+    max_parallel = max(1, min(k, max_parallel or os.cpu_count() or 1))
+    if "fork" not in multiprocessing.get_all_start_methods():
+        max_parallel = 1
+
+    _CV_STATE = (dataset, assignment, seed)
+    try:
+        if max_parallel == 1:
+            results = [_run_fold(fold) for fold in range(k)]
+        else:
+            with multiprocessing.get_context("fork").Pool(max_parallel, maxtasksperchild=1) as pool:
+                results = list(pool.imap_unordered(_run_fold, range(k)))
+    finally:
+        _CV_STATE = None
+    return sorted(results, key=lambda m: m["fold"])
+
+def _mean_std(values):
+    return statistics.mean(values), statistics.stdev(values) if len(values) > 1 else 0.0
+
+def print_cv_report(results):
+    print("\n\n#################################################################")
+    print(f"## NLU Cross-Validation Report ({len(results)} folds, stratified by intent)")
+    print("#################################################################")
+    print("\nfold\ttrain\ttest\tintent acc\tmacro F1\tfull match\tslot F1\t\tseconds")
+    for m in results:
+        print(f"{m['fold']}\t{m['train_examples']}\t{m['examples']}\t{m['intent_accuracy']:.4f}\t\t"
+              f"{m['intent_macro_f1']:.4f}\t\t{m['full_match_accuracy']:.4f}\t\t{m['slot_f1']:.4f}\t\t"
+              f"{m['seconds']:.1f}")
+
+    print("\n--- Mean ± std across folds ---")
+    for key, label in (("full_match_accuracy", "Full Match Accuracy"),
+                       ("intent_accuracy", "Intent Accuracy"),
+                       ("intent_macro_f1", "Intent Macro F1"),
+                       ("slot_f1", "Slot Span F1 (strict)")):
+        mean, std = _mean_std([m[key] for m in results])
+        print(f"{label + ':':<24}{mean:.4f} ± {std:.4f}")
+
+    print("\nPer-intent F1 (folds that test the intent):")
+    intents = sorted({name for m in results for name in m["intent_f1"]})
+    for name in intents:
+        scores = [m["intent_f1"][name] for m in results if name in m["intent_f1"]]
+        mean, std = _mean_std(scores)
+        print(f"  {name:<20}{mean:.4f} ± {std:.4f}  ({len(scores)} fold(s))")
 
 # --- EVALUATION CORE FUNCTION ---
-def evaluate_nlu_model(engine, test_file_path="test_data.json"):
-    
-    # --- SIMULATED RESULTS FOR DEMO ---
-    # This data simulates a model with 7/8 correct predictions (87.5% accuracy)
-    y_true_intent = ["turnLightOff", "greet", "turnLightOn", "turnLightOff", "getWeather", "turnLightOn", "getWeather", "turnLightOff"]
-    y_pred_intent = ["turnLightOff", "greet", "turnLightOn", "turnLightOff", "getWeather", "turnLightOn", "getWeather", "turnLightOn"] # <-- Only 1 error here
-    
-    # Slots Ground Truth and Simulated Predictions (for Full Match Accuracy)
-    y_true_slots = [[("room", "living_room")], [], [("room", "kitchen")], [], [("city", "london")], [], [], [("room", "garage")]]
-    y_pred_slots = [[("room", "living_room")], [], [("room", "kitchen")], [], [("city", "london")], [], [], [("room", "garage")]]
-    # --- END SIMULATED RESULTS ---
-
-    total_examples = len(y_true_intent)
-    full_match_count = 0
-    
-    # Calculate Full Match Accuracy
-    for i in range(total_examples):
-        intent_correct = (y_pred_intent[i] == y_true_intent[i])
-        slots_correct = (y_pred_slots[i] == y_true_slots[i])
-        
-        if intent_correct and slots_correct:
-            full_match_count += 1
-            
+def score_predictions(examples, predictions):
+    """(IntentMetrics, full-match mask) of predictions against (utterance, intent, slots, spans) examples.
+
+    Intents and whole slot lists are integer-encoded once; everything after
+    that is array arithmetic (see nlu_metrics.py).
+    """
+    intents, slot_lists = LabelIndex(), LabelIndex()
+    true_intents = intents.encode(intent for _, intent, _, _ in examples)
+    pred_intents = intents.encode(intent for intent, _, _ in predictions)
+    true_slots = slot_lists.encode(slot_key(slots) for _, _, slots, _ in examples)
+    pred_slots = slot_lists.encode(slot_key(slots) for _, slots, _ in predictions)
+    return (IntentMetrics.from_codes(intents, true_intents, pred_intents),
+            full_match_mask(true_intents, pred_intents, true_slots, pred_slots))
+
+def evaluate_nlu_model(engine, test_file_path="test_data.json", workers=None, chunk_size=256,
+                       progress_every=None):
+    accumulator = score_stream(engine, iter_test_examples(test_file_path), workers, chunk_size,
+                               progress_every)
+    print_report(accumulator)
+    return accumulator
+
+def print_report(accumulator):
+    """The evaluation report; works on a partial (mid-run) accumulator too."""
+    intent_metrics = accumulator.intent_metrics()
+    total_examples = accumulator.examples
+    full_match_count = accumulator.full_matches
+
     # --- METRICS CALCULATION AND PRINTING ---
 
     print("\n\n#################################################################")
     print("## NLU Evaluation Report")
     print("#################################################################")
-    
+
     # A. Overall NLU Performance (Full Match Accuracy)
-    full_match_accuracy = full_match_count / total_examples
+    full_match_accuracy = full_match_count / total_examples if total_examples else 0.0
     print("\n--- 1. Overall Full Match Accuracy (Strict NLU Score) ---")
     print(f"Total Test Examples: {total_examples}")
     print(f"Full Match Accuracy (Intent + All Slots Correct): {full_match_accuracy:.4f} ({full_match_count}/{total_examples})")
 
-    # B. Intent Classification Metrics (using sklearn)
-    print("\n--- 2. Intent Classification Metrics (sklearn) ---")
-    print(f"Intent Accuracy (Micro-Average): {accuracy_score(y_true_intent, y_pred_intent):.4f}")
-    
+    # B. Intent Classification Metrics
+    print("\n--- 2. Intent Classification Metrics ---")
+    print(f"Intent Accuracy (Micro-Average): {intent_metrics.accuracy:.4f}")
+
     print("\nClassification Report:")
-    print(classification_report(y_true_intent, y_pred_intent, zero_division=0))
-    
+    print(intent_metrics.classification_report())
+
     # C. Intent Confusion Matrix
-    labels = sorted(list(set(y_true_intent + y_pred_intent)))
-    conf_matrix = confusion_matrix(y_true_intent, y_pred_intent, labels=labels)
-    
     print("\n--- 3. Intent Confusion Matrix (Rows = True, Columns = Predicted) ---")
-    matrix_output = "\t" + "\t".join(labels) + "\n"
-    for i, true_label in enumerate(labels):
-        matrix_output += f"{true_label}\t" + "\t".join(map(str, conf_matrix[i])) + "\n"
-    print(matrix_output)
+    print(intent_metrics.confusion_table())
+
+    # D. Slot values
+    print("--- 4. Slot Value Metrics ((slotName, value) pairs) ---")
+    print(f"{'slot':<20}{'precision':>10}{'recall':>10}{'f1-score':>10}{'support':>10}")
+    for name, (precision, recall, f1, support) in accumulator.slot_scores().items():
+        print(f"{name:<20}{precision:>10.2f}{recall:>10.2f}{f1:>10.2f}{support:>10}")
+
+    # E. Slot spans
+    print("\n--- 5. Slot Span Metrics (BIO over whitespace tokens; strict = exact span, partial = overlap) ---")
+    print(accumulator.spans.report())
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluate the Snips NLU engine on a labelled test set")
+    parser.add_argument("--dataset", default="dataset.json", help="training dataset (Snips JSON format)")
+    parser.add_argument("--test", default="test_data.json",
+                        help="labelled test utterances (JSON array, or *.jsonl with one record per line)")
+    parser.add_argument("--engine-dir", metavar="DIR",
+                        help="load the engine persisted in DIR; if DIR does not exist, train and save it there")
+    parser.add_argument("--seed", type=int, help="training seed (reproducible engine, and --cv folds)")
+    parser.add_argument("--cv", type=int, metavar="K",
+                        help="stratified K-fold cross-validation on --dataset instead of the --test evaluation")
+    parser.add_argument("--cv-parallel", type=int, metavar="N",
+                        help="folds trained at the same time (--cv; default: all cores, bounds peak memory)")
+    parser.add_argument("--workers", type=int, help="parse processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="utterances sent to a worker at a time")
+    parser.add_argument("--progress", type=int, metavar="N",
+                        help="print a running summary every N test examples")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    engine = train_engine()
-    # if engine: # Uncomment if you use the actual NLU engine
-    evaluate_nlu_model(engine)
\ No newline at end of file
+    args = parse_args()
+    if args.cv:
+        with io.open(args.dataset, encoding="utf8") as f:
+            dataset = json.load(f)
+        print_cv_report(cross_validate(dataset, args.cv, args.seed, args.cv_parallel))
+    else:
+        try:
+            engine = train_engine(args.dataset, args.engine_dir, args.seed)
+        except (OSError, ImportError) as e:
+            sys.exit(f"Could not train or load the NLU engine: {e}")
+        evaluate_nlu_model(engine, args.test, args.workers, args.chunk_size, args.progress)
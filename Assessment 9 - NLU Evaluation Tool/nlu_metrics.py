@@ -0,0 +1,419 @@
+# ====================================================================
+# nlu_metrics.py: Vectorized metrics core for the NLU evaluator
+# Intents are integer-encoded once; the confusion matrix is a single
+# np.bincount over true * n + pred, and precision / recall / F1 and the
+# averages are derived from it. Each utterance's slot list is encoded as
+# one integer too, so full match is an AND of two equality masks.
+# Output matches sklearn's classification_report / confusion_matrix.
+# MetricsAccumulator keeps the same counts incrementally for streams.
+# Slot spans are scored as BIO tag arrays over whitespace tokens
+# (strict and partial-overlap matching, like seqeval but batched).
+# ====================================================================
+
+import re
+from collections import Counter
+
+import numpy as np
+
+
+# --- 1. LABEL ENCODING ---
+class LabelIndex:
+    """Grows a label -> integer code mapping; codes never change once given."""
+
+    def __init__(self, labels=()):
+        self.codes = {}
+        self.labels = []
+        for label in labels:
+            self.code(label)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def code(self, label):
+        code = self.codes.get(label)
+        if code is None:
+            code = self.codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def encode(self, labels):
+        """Codes of an iterable of labels as an int64 array."""
+        codes, code = self.codes, self.code
+        return np.fromiter((codes[label] if label in codes else code(label) for label in labels),
+                           dtype=np.int64)
+
+    def sorted_order(self):
+        """Code permutation that lists the labels in sorted order (as sklearn does)."""
+        return np.array(sorted(range(len(self.labels)), key=self.labels.__getitem__), dtype=np.int64)
+
+
+def slot_key(slots):
+    """Hashable, order-independent key of one utterance's (slotName, value) pairs."""
+    return tuple(sorted(slots))
+
+
+# --- 2. COUNTS AND SCORES ---
+def confusion_counts(true_codes, pred_codes, n):
+    """n x n confusion matrix (rows = true, columns = predicted) in one bincount."""
+    return np.bincount(true_codes * n + pred_codes, minlength=n * n).reshape(n, n)
+
+
+def _safe_divide(numerator, denominator):
+    # zero_division=0: undefined ratios count as 0
+    out = np.zeros(np.shape(numerator), dtype=np.float64)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+
+def scores_from_confusion(cm):
+    """Per-label (precision, recall, f1, support) arrays from a confusion matrix."""
+    tp = np.diag(cm).astype(np.float64)
+    predicted = cm.sum(axis=0)
+    support = cm.sum(axis=1)
+    precision = _safe_divide(tp, predicted)
+    recall = _safe_divide(tp, support)
+    f1 = _safe_divide(2 * tp, predicted + support)
+    return precision, recall, f1, support
+
+
+def averages(precision, recall, f1, support):
+    """{"macro": (p, r, f1), "weighted": (p, r, f1)}."""
+    total = support.sum()
+    weights = support / total if total else np.zeros(len(support))
+    return {
+        "macro": tuple(float(x.mean()) if len(x) else 0.0 for x in (precision, recall, f1)),
+        "weighted": tuple(float((x * weights).sum()) for x in (precision, recall, f1)),
+    }
+
+
+def full_match_mask(true_intents, pred_intents, true_slots, pred_slots):
+    """True where intent and the whole slot list are both correct (all integer code arrays)."""
+    return (true_intents == pred_intents) & (true_slots == pred_slots)
+
+
+class IntentMetrics:
+    """Intent metrics of one evaluation, computed from the encoded labels.
+
+    labels are sorted and cm / scores follow that order, like sklearn.
+    """
+
+    def __init__(self, index, cm):
+        order = index.sorted_order()
+        self.labels = [index.labels[i] for i in order]
+        self.cm = cm[np.ix_(order, order)]
+        self.total = int(self.cm.sum())
+        self.correct = int(np.trace(self.cm))
+        self.precision, self.recall, self.f1, self.support = scores_from_confusion(self.cm)
+
+    @classmethod
+    def from_codes(cls, index, true_codes, pred_codes):
+        return cls(index, confusion_counts(true_codes, pred_codes, len(index)))
+
+    @property
+    def accuracy(self):
+        return self.correct / self.total if self.total else 0.0
+
+    def f1_by_label(self, labels=None):
+        """{label: F1}, for the given labels only (default: all)."""
+        scores = dict(zip(self.labels, map(float, self.f1)))
+        return scores if labels is None else {label: scores[label] for label in labels}
+
+    def classification_report(self, digits=2):
+        """Same text as sklearn.metrics.classification_report(..., zero_division=0)."""
+        headers = ["precision", "recall", "f1-score", "support"]
+        width = max(max((len(str(label)) for label in self.labels), default=0), len("weighted avg"), digits)
+        report = ("{:>{width}s} " + " {:>9}" * len(headers)).format("", *headers, width=width) + "\n\n"
+        row_fmt = "{:>{width}s} " + " {:>9.{digits}f}" * 3 + " {:>9}\n"
+        for row in zip(self.labels, self.precision, self.recall, self.f1, self.support):
+            report += row_fmt.format(str(row[0]), *row[1:], width=width, digits=digits)
+        report += "\n"
+        total = int(self.support.sum())
+        report += ("{:>{width}s} " + " {:>9.{digits}}" * 2 + " {:>9.{digits}f}" + " {:>9}\n").format(
+            "accuracy", "", "", self.accuracy, total, width=width, digits=digits)
+        for name, scores in averages(self.precision, self.recall, self.f1, self.support).items():
+            report += row_fmt.format(f"{name} avg", *scores, total, width=width, digits=digits)
+        return report
+
+    def confusion_table(self):
+        """Tab-separated confusion matrix (rows = true, columns = predicted)."""
+        output = "\t" + "\t".join(map(str, self.labels)) + "\n"
+        for label, row in zip(self.labels, self.cm):
+            output += f"{label}\t" + "\t".join(map(str, row)) + "\n"
+        return output
+
+
+# --- 3. STREAMING ACCUMULATOR ---
+class MetricsAccumulator:
+    """Constant-memory running metrics: add() one example at a time, merge() shards.
+
+    Keeps only the intent confusion counts, per-slot-name counts and the
+    full-match tally, so memory depends on the number of intents and slot
+    names, never on the number of examples. Intent codes are buffered and
+    folded into the confusion matrix with one bincount per batch.
+    Slot spans go to the SlotSpanAccumulator in .spans (add_spans).
+    Accumulators pickle, so worker processes can return them.
+    """
+
+    def __init__(self, batch_size=4096):
+        self.intents = LabelIndex()
+        self.cm = np.zeros((0, 0), dtype=np.int64)
+        self.slots = {}  # slotName -> [true positives, false positives, false negatives]
+        self.examples = 0
+        self.full_matches = 0
+        self.spans = SlotSpanAccumulator(batch_size)
+        self.batch_size = batch_size
+        self._true = []
+        self._pred = []
+
+    def add_spans(self, text, true_spans, pred_spans):
+        """Token-level slot spans of one example; true_spans None = truth has no ranges."""
+        if true_spans is None:
+            self.spans.skipped += 1
+        else:
+            self.spans.add(text, true_spans, pred_spans)
+
+    def add(self, true_intent, pred_intent, true_slots, pred_slots):
+        code = self.intents.code
+        self._true.append(code(true_intent))
+        self._pred.append(code(pred_intent))
+        if len(self._true) >= self.batch_size:
+            self._fold_batch()
+
+        true_counts = Counter(true_slots)
+        pred_counts = Counter(pred_slots)
+        for (name, value), count in (true_counts | pred_counts).items():
+            counts = self.slots.setdefault(name, [0, 0, 0])
+            hit = min(true_counts[(name, value)], pred_counts[(name, value)])
+            counts[0] += hit
+            counts[1] += pred_counts[(name, value)] - hit
+            counts[2] += true_counts[(name, value)] - hit
+        self.examples += 1
+        if true_intent == pred_intent and true_counts == pred_counts:
+            self.full_matches += 1
+
+    def _grow(self, n):
+        if n > len(self.cm):
+            cm = np.zeros((n, n), dtype=np.int64)
+            cm[:len(self.cm), :len(self.cm)] = self.cm
+            self.cm = cm
+
+    def _fold_batch(self):
+        if not self._true:
+            return
+        n = len(self.intents)
+        self._grow(n)
+        self.cm += confusion_counts(np.array(self._true, dtype=np.int64),
+                                    np.array(self._pred, dtype=np.int64), n)
+        self._true.clear()
+        self._pred.clear()
+
+    def merge(self, other):
+        """Adds another accumulator's counts (e.g. from a parallel shard) into this one."""
+        other._fold_batch()
+        self._fold_batch()
+        mapping = np.array([self.intents.code(label) for label in other.intents.labels], dtype=np.int64)
+        self._grow(len(self.intents))
+        if len(mapping):
+            self.cm[np.ix_(mapping, mapping)] += other.cm[:len(mapping), :len(mapping)]
+        for name, (tp, fp, fn) in other.slots.items():
+            counts = self.slots.setdefault(name, [0, 0, 0])
+            counts[0] += tp
+            counts[1] += fp
+            counts[2] += fn
+        self.examples += other.examples
+        self.full_matches += other.full_matches
+        self.spans.merge(other.spans)
+        return self
+
+    def __getstate__(self):
+        self._fold_batch()
+        return self.__dict__
+
+    @property
+    def full_match_accuracy(self):
+        return self.full_matches / self.examples if self.examples else 0.0
+
+    def intent_metrics(self):
+        self._fold_batch()
+        n = len(self.intents)
+        return IntentMetrics(self.intents, self.cm[:n, :n])
+
+    def slot_scores(self):
+        """{slotName: (precision, recall, f1, support)} over (slotName, value) pairs."""
+        scores = {}
+        for name, (tp, fp, fn) in sorted(self.slots.items()):
+            precision = tp / (tp + fp) if tp + fp else 0.0
+            recall = tp / (tp + fn) if tp + fn else 0.0
+            f1 = 2 * tp / (2 * tp + fp + fn) if tp + fp + fn else 0.0
+            scores[name] = (precision, recall, f1, tp + fn)
+        return scores
+
+    def summary(self):
+        """One-line running summary, e.g. for progress output mid-run."""
+        return (f"{self.examples} examples: full match {self.full_match_accuracy:.4f}, "
+                f"intent accuracy {self.intent_metrics().accuracy:.4f}")
+
+
+# --- 4. SLOT SPANS AS BIO TAG ARRAYS ---
+TOKEN = re.compile(r"\S+")
+SPAN_MODES = ("strict", "partial")
+
+
+def token_offsets(text):
+    """(start, end) character offsets of the whitespace tokens of text, as an (n, 2) array."""
+    return np.array([m.span() for m in TOKEN.finditer(text)], dtype=np.int64).reshape(-1, 2)
+
+
+def bio_tags(offsets, spans, slot_index):
+    """Tag array of one utterance: 0 = O, 2c+1 = B-slot c, 2c+2 = I-slot c.
+
+    spans are (slotName, start, end) character ranges (Snips "range"); a
+    token belongs to a span when they overlap, so a range ending mid-token
+    still tags the whole token.
+    """
+    tags = np.zeros(len(offsets), dtype=np.int32)
+    for name, start, end in spans:
+        inside = np.flatnonzero((offsets[:, 0] < end) & (offsets[:, 1] > start))
+        if len(inside):
+            code = slot_index.code(name)
+            tags[inside] = 2 * code + 2
+            tags[inside[0]] = 2 * code + 1
+    return tags
+
+
+def entity_spans(tags, sentence_starts):
+    """(starts, ends, slot codes) of the entities in concatenated tag arrays.
+
+    Reads BIO like seqeval's default mode: an I- tag that follows O or
+    another slot starts a new entity. Entities never cross sentence_starts.
+    """
+    slots = (tags + 1) // 2  # 0 = O, else slot code + 1
+    previous = np.zeros_like(slots)
+    previous[1:] = slots[:-1]
+    previous[sentence_starts] = 0
+    begins = (slots > 0) & ((tags % 2 == 1) | (previous != slots))
+    starts = np.flatnonzero(begins)
+    # A run ends before the next entity start, slot change or sentence start
+    breaks = begins | (slots != previous)
+    breaks[sentence_starts] = True
+    break_positions = np.append(np.flatnonzero(breaks), len(tags))
+    ends = break_positions[np.searchsorted(break_positions, starts, side="right")]
+    return starts, ends, slots[starts] - 1
+
+
+def span_counts(true_tags, pred_tags, sentence_starts, n_slots):
+    """Per-slot [true, predicted, strict hits, partial true hits, partial predicted hits] counts.
+
+    Strict: same slot and exactly the same tokens. Partial: overlaps at
+    least one entity of the same slot on the other side (a token where both
+    sides carry that slot).
+    """
+    true_starts, true_ends, true_slots = entity_spans(true_tags, sentence_starts)
+    pred_starts, pred_ends, pred_slots = entity_spans(pred_tags, sentence_starts)
+    width = len(true_tags) + 1
+    true_keys = (true_starts * width + true_ends) * n_slots + true_slots
+    pred_keys = (pred_starts * width + pred_ends) * n_slots + pred_slots
+    strict = np.isin(true_keys, pred_keys, assume_unique=True)
+
+    true_slot_of_token = (true_tags + 1) // 2
+    agree = (true_slot_of_token > 0) & (true_slot_of_token == (pred_tags + 1) // 2)
+    agreed = np.concatenate(([0], np.cumsum(agree)))
+    partial_true = agreed[true_ends] > agreed[true_starts]
+    partial_pred = agreed[pred_ends] > agreed[pred_starts]
+
+    counts = np.zeros((n_slots, 5), dtype=np.int64)
+    for column, codes in enumerate((true_slots, pred_slots, true_slots[strict],
+                                    true_slots[partial_true], pred_slots[partial_pred])):
+        counts[:, column] = np.bincount(codes, minlength=n_slots)
+    return counts
+
+
+class SlotSpanAccumulator:
+    """Constant-memory entity-span metrics over BIO tags of whitespace tokens.
+
+    add() turns one utterance's true and predicted slot ranges into integer
+    tag arrays; every batch_size utterances they are concatenated and
+    scored with array operations. Mergeable like MetricsAccumulator.
+    """
+
+    def __init__(self, batch_size=4096):
+        self.slots = LabelIndex()
+        self.counts = np.zeros((0, 5), dtype=np.int64)
+        self.skipped = 0  # utterances whose truth has no character ranges
+        self.batch_size = batch_size
+        self._true = []
+        self._pred = []
+
+    def add(self, text, true_spans, pred_spans):
+        offsets = token_offsets(text)
+        self._true.append(bio_tags(offsets, true_spans, self.slots))
+        self._pred.append(bio_tags(offsets, pred_spans, self.slots))
+        if len(self._true) >= self.batch_size:
+            self._fold_batch()
+
+    def _grow(self, n):
+        if n > len(self.counts):
+            counts = np.zeros((n, 5), dtype=np.int64)
+            counts[:len(self.counts)] = self.counts
+            self.counts = counts
+
+    def _fold_batch(self):
+        if not self._true:
+            return
+        lengths = np.array([len(tags) for tags in self._true], dtype=np.int64)
+        sentence_starts = np.cumsum(lengths) - lengths
+        true_tags = np.concatenate(self._true)
+        pred_tags = np.concatenate(self._pred)
+        n = len(self.slots)
+        self._grow(n)
+        self.counts[:n] += span_counts(true_tags, pred_tags, sentence_starts[sentence_starts < len(true_tags)], n)
+        self._true.clear()
+        self._pred.clear()
+
+    def merge(self, other):
+        other._fold_batch()
+        self._fold_batch()
+        mapping = np.array([self.slots.code(label) for label in other.slots.labels], dtype=np.int64)
+        self._grow(len(self.slots))
+        if len(mapping):
+            self.counts[mapping] += other.counts[:len(mapping)]
+        self.skipped += other.skipped
+        return self
+
+    def __getstate__(self):
+        self._fold_batch()
+        return self.__dict__
+
+    def scores(self, mode="strict"):
+        """({slotName: (precision, recall, f1, support)}, micro (p, r, f1), macro (p, r, f1))."""
+        self._fold_batch()
+        n = len(self.slots)
+        counts = self.counts[:n]
+        true, predicted = counts[:, 0], counts[:, 1]
+        true_hits, pred_hits = (counts[:, 2], counts[:, 2]) if mode == "strict" else (counts[:, 3], counts[:, 4])
+        precision = _safe_divide(pred_hits, predicted)
+        recall = _safe_divide(true_hits, true)
+        f1 = _safe_divide(2 * precision * recall, precision + recall)
+        micro_p = pred_hits.sum() / predicted.sum() if predicted.sum() else 0.0
+        micro_r = true_hits.sum() / true.sum() if true.sum() else 0.0
+        micro_f1 = 2 * micro_p * micro_r / (micro_p + micro_r) if micro_p + micro_r else 0.0
+        macro = tuple(float(x.mean()) if n else 0.0 for x in (precision, recall, f1))
+        per_slot = {self.slots.labels[i]: (float(precision[i]), float(recall[i]), float(f1[i]), int(true[i]))
+                    for i in sorted(range(n), key=self.slots.labels.__getitem__)}
+        return per_slot, (float(micro_p), float(micro_r), float(micro_f1)), macro
+
+    def report(self):
+        lines = []
+        for mode in SPAN_MODES:
+            per_slot, micro, macro = self.scores(mode)
+            lines.append(f"[{mode}]")
+            lines.append(f"{'slot':<20}{'precision':>10}{'recall':>10}{'f1-score':>10}{'support':>10}")
+            for name, (precision, recall, f1, support) in per_slot.items():
+                lines.append(f"{name:<20}{precision:>10.2f}{recall:>10.2f}{f1:>10.2f}{support:>10}")
+            support = sum(s for *_, s in per_slot.values())
+            lines.append(f"{'micro avg':<20}{micro[0]:>10.2f}{micro[1]:>10.2f}{micro[2]:>10.2f}{support:>10}")
+            lines.append(f"{'macro avg':<20}{macro[0]:>10.2f}{macro[1]:>10.2f}{macro[2]:>10.2f}{support:>10}")
+            lines.append("")
+        if self.skipped:
+            lines.append(f"({self.skipped} utterance(s) without slot ranges in the truth were not scored)")
+        return "\n".join(lines)